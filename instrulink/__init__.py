@@ -4,8 +4,19 @@
 # @Last Modified by:   Theo Lemaire
 # @Last Modified time: 2023-05-11 15:34:28
 
+from . import factory
 from .factory import *
 from .logger import *
 from .si_utils import *
-from .visa_instrument import VisaError, list_visa_resources
-from .sutter_mp285a import SutterError
\ No newline at end of file
+from .errors import VisaError, SutterError
+from .visa_instrument import list_visa_resources
+
+# Public names, including built-in instrument classes (imported upon star-import only)
+__all__ = [name for name in globals() if not name.startswith('_')] + list(factory.builtin_classes)
+
+
+def __getattr__(name):
+    ''' Expose built-in instrument classes without importing their backends upfront '''
+    if name in factory.builtin_classes:
+        return factory.load_instrument_class(factory.builtin_classes[name])
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -5,12 +5,13 @@
 # @Last Modified time: 2024-05-07 15:26:41
 # @Last Modified time: 2022-04-08 21:17:22
 
+import os
 import re
+import logging
 import struct
 
 from .constants import *
 from .si_utils import *
-from .utils import is_within
 from .oscilloscope import Oscilloscope
 from .visa_instrument import VisaError
 from .logger import logger
@@ -21,14 +22,23 @@ class BK2555(Oscilloscope):
     USB_ID = '378[A-Z]181\d+'  # USB identifier
     PREFIX = ''  # prefix to be added to each command
     TIMEOUT_SECONDS = 20.  # long timeout to allow slow commands (e.g. auto-setup)
+    CHUNK_SIZE = 64 * 1024  # large read chunks (in bytes) for waveform and screenshot transfers
     CHANNELS = (1, 2, 3, 4)  # available channels
+    CHANNEL_COMMANDS = {  # pre-formatted channel-specific commands, indexed by (channel, command)
+        (c, cmd): f'C{c}:{cmd}' for c in CHANNELS for cmd in (
+            'TRA ON', 'TRA OFF', 'TRA?', 'VDIV?', 'OFST?', 'FILT ON', 'FILT OFF', 'FILT?',
+            'ATTN?', 'CPL?', 'TRCP?', 'TRSL?', 'TRLV?')
+    }
+    CONCURRENT_WAVEFORM_FETCH = True  # waveform queries are channel-specific
+    BATCH_SCPI = True  # instrument accepts compound (semicolon-separated) messages
     NHDIVS = 18  # Number of horizontal divisions
     NVDIVS = 8  # Number of vertical divisions
     NO_ERROR_CODE = 'CMR 0'  # error code returned when no error
     MAX_VDIV = 5.  # Max voltage per division (V)
-    TBASES = [1, 2.5, 5]  # timebase relative values
-    TFACTORS = np.logspace(-9, 1, 11)  # timebase multiplying factors
-    TDIVS = np.ravel((np.tile(TBASES, (TFACTORS.size, 1)).T * TFACTORS).T)  # timebase values
+    # Timebase values, enumerated once at class definition in strictly ascending order
+    # (decades outer, mantissas inner), as required for nearest-value lookup
+    TDIVS = np.array([b * 10.**e for e in range(-9, 2) for b in (1., 2.5, 5.)])
+    LOG_TDIVS = np.log(TDIVS)  # log-timebase values (for nearest-value lookup)
 
     # Acquisition parameters
     COUPLING_MODES = (  # coupling modes
@@ -38,20 +48,28 @@ class BK2555(Oscilloscope):
         'D50',  # direct current, 50 Ohm input impedance
         'GND'   # ground
     )
+    COUPLING_MODE_SET = frozenset(COUPLING_MODES)  # same, for constant-time validation
     ACQ_TYPES = ('PEAK_DETECT','SAMPLING','AVERAGE')  # acquisition types
+    ACQ_TYPE_SET = frozenset(ACQ_TYPES)  # same, for constant-time validation
     NAVGS = (1, 4, 16, 32, 64, 128, 256)  # number of samples to average for average acquisition
+    NAVG_SET = frozenset(NAVGS)  # same, for constant-time validation
     INTERP_TYPES = ('linear', 'sine')  # interpolation types
+    INTERP_TYPE_SET = frozenset(INTERP_TYPES)  # same, for constant-time validation
 
     # Trigger parameters
     TRIGGER_MODES = ('AUTO', 'NORM', 'SINGLE', 'STOP')  # trigger modes
+    TRIGGER_MODE_SET = frozenset(TRIGGER_MODES)  # same, for constant-time validation
     TRIGGER_COUPLING_MODES = ('AC', 'DC', 'HFREJ', 'LFREJ')  # trigger coupling modes
+    TRIGGER_COUPLING_MODE_SET = frozenset(TRIGGER_COUPLING_MODES)  # same, for constant-time validation
     TRIG_TYPES = (  # trigger types
         'EDGE',  # edge trigger
         'GLIT',  # pulse trigger
         'INTV',  # slope trigger
         'TV'  # video trigger
     )
+    TRIG_TYPE_SET = frozenset(TRIG_TYPES)  # same, for constant-time validation
     TRIGGER_SLOPES = ('NEG', 'POS', 'WINDOW')  # trigger slopes
+    TRIGGER_SLOPE_SET = frozenset(TRIGGER_SLOPES)  # same, for constant-time validation
     HOLD_TYPES = (  # pulse types
         'TI',  # holdoff
         'PS',  # if pulse width is smaller than the set value (in GLIT mode)
@@ -64,10 +82,21 @@ class BK2555(Oscilloscope):
 
     # Cursor parameters
     CURSOR_TYPES = ('HREF', 'HDIF', 'VREF', 'VDIF', 'TREF', 'TDIF')  # cursor types
+    CURSOR_TYPE_SET = frozenset(CURSOR_TYPES)  # same, for constant-time validation
+    CURSOR_DIV_BOUNDS = {  # valid cursor position bounds (in number of divisions) per cursor type
+        'HREF': (0.1, NHDIVS - 0.1),
+        'HDIF': (0.1, NHDIVS - 0.1),
+        'VREF': (-NHDIVS / 2, NHDIVS / 2),
+        'VDIF': (-NHDIVS / 2, NHDIVS / 2),
+        'TREF': (-NVDIVS / 2, NVDIVS / 2),
+        'TDIF': (-NVDIVS / 2, NVDIVS / 2),
+    }
     CVALUES_TYPES = ('HREL', 'VREL')  # cursor value types
+    CVALUES_TYPE_SET = frozenset(CVALUES_TYPES)  # same, for constant-time validation
 
     # Filter parameters
     FILTER_TYPES = ('LP', 'HP', 'BP', 'BR')  # filter types
+    FILTER_TYPE_SET = frozenset(FILTER_TYPES)  # same, for constant-time validation
     FILTER_REL_LIMS = (2.5, 230)  # Filter cutoff limits (Hz * (s/div) = 1/div)
 
     # Unit parameters
@@ -98,6 +127,135 @@ class BK2555(Oscilloscope):
         'NDUTY': '%'  # negative duty cycle
     }
 
+    # Reply parsing parameters
+    REPLY_PARSERS = {  # reply parser type per reply header mnemonic
+        'TDIV': 'value',  # temporal scale
+        'VDIV': 'value',  # vertical scale
+        'OFST': 'value',  # vertical offset
+        'TRLV': 'value',  # trigger level
+        'TRDL': 'value',  # trigger delay
+        'SARA': 'value',  # sample rate
+        '*STB': 'int',  # status byte register
+        '*ESR': 'int',  # standard event status register
+        'ATTN': 'float',  # probe attenuation
+        'AVGA': 'int',  # number of sweeps per acquisition
+        'SANU': 'int',  # number of samples
+        'CPL': 'str',  # coupling mode
+        'TRMD': 'str',  # trigger mode
+        'TRCP': 'str',  # trigger coupling mode
+        'TRSL': 'str',  # trigger slope
+        'SAST': 'str',  # acquisition status
+        'ACQW': 'str',  # acquisition type
+        'TRA': 'bool',  # trace display
+        'FILT': 'bool',  # filter status
+        'SXSA': 'bool',  # sine interpolation
+    }
+    REPLY_VALUE_PATTERN = re.compile(f'^({SI_REGEXP}|{FLOAT_REGEXP})([A-Za-z%]+)')  # value + unit
+    BWL_PATTERN = re.compile(  # bandwidth filters
+        'BWL ' + ','.join([f'C{c},(ON|OFF)' for c in CHANNELS]))
+    CRST_PATTERN = re.compile(f'C\d:CRST [A-Z]+,({FLOAT_REGEXP})')  # cursor position
+    CRVA_PATTERNS = {  # cursor values
+        'HREL': re.compile(
+            f'C\d:CRVA HREL,({SI_REGEXP}),({SI_REGEXP}),({SI_REGEXP}),({FLOAT_REGEXP})'),
+        'VREL': re.compile(f'C\d:CRVA VREL,({SI_REGEXP})'),
+    }
+    TRSE_PATTERN = re.compile((  # trigger options (matched against raw bytes replies)
+        f'TRSE ({"|".join(TRIG_TYPES)}),SR,C({INT_REGEXP}),'
+        f'HT,({"|".join(HOLD_TYPES)}),HV,({FLOAT_REGEXP})([A-Za-z]+)').encode())
+    PAVA_PATTERN = re.compile(  # parameter value
+        f'C\d:PAVA [A-Z]+,({SI_REGEXP}|{FLOAT_REGEXP})([A-Za-z%]+)')
+    WFSU_PATTERN = re.compile(  # waveform settings (matched against raw bytes replies)
+        rb'WFSU SP,([0-9]+),NP,([0-9]+),FP,([0-9]+),SN,([0-9]+)')
+    CFMT_PATTERN = re.compile(  # communication format (matched against raw bytes replies)
+        rb'^CFMT (DEF9|IND0|OFF),(BYTE|WORD),(BIN|HEX)$')
+
+    # Time to live (in s) of cached query replies
+    SARA_CACHE_TTL = 0.2  # sample rate
+    WFSU_CACHE_TTL = 0.2  # waveform settings
+    CFMT_CACHE_TTL = 5.  # communication format
+
+    # Waveform template cache directory
+    TEMPLATE_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.instrulink')
+
+    # Waveform descriptor layout of fields of interest, starting at byte 148:
+    # sweeps/acq (l), 4 skipped bytes, vertical gain (f) and offset (f), 12 skipped bytes,
+    # sampling interval (f) and horizontal offset (d)
+    WAVEDESC_OFFSET = 148
+    WAVEDESC_STRUCT = struct.Struct('<l4xff12xfd')
+
+    _sample_indexes = np.arange(0, dtype=np.float64)  # cached sample indexes (grown on demand)
+
+    # --------------------- REPLY PARSING ---------------------
+
+    def query_reply(self, text):
+        '''
+        Query instrument and parse its reply, checking that it answers the query
+
+        :param text: query text (e.g. "C1:VDIV?")
+        :return: parsed reply value
+        '''
+        return self.parse_reply(self.query(text), expected=text.partition('?')[0])
+
+    def parse_reply(self, out, expected=None):
+        '''
+        Parse an instrument reply by dispatching it to the appropriate parser
+        based on its header mnemonic (channel prefix excluded).
+
+        :param out: instrument reply string (e.g. "C1:VDIV 5.00E-01V")
+        :param expected: expected reply header, with channel prefix if any (optional)
+        :return: parsed reply value
+        '''
+        header, _, payload = out.partition(' ')
+        key = header.rpartition(':')[2]
+        if expected is not None and header != expected:
+            raise VisaError(f'unexpected reply header "{header}" (expected "{expected}", reply = "{out}")')
+        try:
+            ptype = self.REPLY_PARSERS[key]
+        except KeyError:
+            raise VisaError(f'no reply parser defined for "{key}" (reply = "{out}")')
+        return getattr(self, f'parse_{ptype}_reply')(key, payload)
+
+    def parse_value_reply(self, key, payload):
+        ''' Parse a (value, unit) reply payload into a float '''
+        # Fast path: split numeric part from (trailing) unit suffix and convert
+        i = len(payload)
+        while i > 0 and not payload[i - 1].isdigit():
+            i -= 1
+        num, unit = payload[:i], payload[i:].split('/')[0]
+        try:
+            return self.process_float(float(num), unit)
+        except (ValueError, KeyError, IndexError):
+            pass
+        # Fall back to regexp parsing
+        mo = self.REPLY_VALUE_PATTERN.match(payload)
+        if mo is None:
+            raise VisaError(f'could not extract {key} value from "{payload}"')
+        return self.process_float(float(mo[1]), mo[2])
+
+    def parse_float_reply(self, key, payload):
+        ''' Parse a (unitless) float reply payload '''
+        try:
+            return float(payload)
+        except ValueError:
+            raise VisaError(f'could not extract {key} value from "{payload}"')
+
+    def parse_int_reply(self, key, payload):
+        ''' Parse an integer reply payload '''
+        try:
+            return int(payload)
+        except ValueError:
+            raise VisaError(f'could not extract {key} integer from "{payload}"')
+
+    def parse_str_reply(self, key, payload):
+        ''' Parse a string reply payload '''
+        return payload
+
+    def parse_bool_reply(self, key, payload):
+        ''' Parse an ON/OFF reply payload into a boolean '''
+        if payload not in ('ON', 'OFF'):
+            raise VisaError(f'could not extract {key} state from "{payload}"')
+        return payload == 'ON'
+
     # --------------------- MISCELLANEOUS ---------------------
 
     def wait(self, t=None):
@@ -106,17 +264,60 @@ class BK2555(Oscilloscope):
         if t is not None:
             s = f'{s} {t}'
         self.write(s)
+
+    def configure(self, ich=None, tdiv=None, vdiv=None, voff=None, trlv=None, trsl=None, trdl=None):
+        '''
+        Set several acquisition parameters in a single compound command, followed
+        by a single synchronization query
+
+        :param ich: channel index (required for channel-specific parameters)
+        :param tdiv: temporal scale (s/div)
+        :param vdiv: vertical scale (V/div)
+        :param voff: vertical offset (V)
+        :param trlv: trigger level (V)
+        :param trsl: trigger slope
+        :param trdl: trigger delay (s)
+        '''
+        if any(x is not None for x in (vdiv, voff, trlv, trsl)):
+            if ich is None:
+                raise VisaError('channel index is required to set channel-specific parameters')
+            self.check_channel_index(ich)
+        parts = []
+        if tdiv is not None:
+            tdiv = self.get_closest_temporal_scale(tdiv)
+            parts.append(f'TDIV {self.si_process(tdiv)}S')
+        if vdiv is not None:
+            vdiv = self.check_vertical_scale(vdiv)
+            parts.append(f'C{ich}:VDIV {self.si_process(vdiv)}V')
+        if voff is not None:
+            parts.append(f'C{ich}:OFST {self.si_process(voff)}V')
+        if trlv is not None:
+            parts.append(f'C{ich}:TRLV {self.si_process(trlv)}V')
+        if trsl is not None:
+            trsl = self.check_trigger_slope(trsl)
+            parts.append(f'C{ich}:TRSL {trsl}')
+        if trdl is not None:
+            # Check delay against new temporal scale, if set within the same message
+            trdl = self.check_trigger_delay(trdl, tdiv=tdiv)
+            parts.append(f'TRDL {self.si_process(trdl)}S')
+        if not parts:
+            return
+        self.log('configuring: %s', ';'.join(parts))
+        self.write_many(parts)
+        self.query('*OPC?')
     
     def get_last_error(self):
         ''' Query instrument for last error code. '''
         return self.query('CMR?')
     
+    def get_event_status_register(self):
+        ''' Get (and clear) the standard event status register value. '''
+        return self.query_reply('*ESR?')
+
     def get_status_byte_register(self):
         ''' Get the status byte register. '''
-        # Query status byte register
-        out = self.query('*STB?')
-        # Extrat status byte register value (integer from 0 to 255)
-        stb_int = self.process_int_mo(out, f'\*STB ({INT_REGEXP})', 'status byte')
+        # Query status byte register and extract its value (integer from 0 to 255)
+        stb_int = self.query_reply('*STB?')
         # Convert to binary string and extract status byte codes
         stb_seq = bin(stb_int)[2:].zfill(8)
         # Assemble outputs as dictionary
@@ -160,18 +361,17 @@ class BK2555(Oscilloscope):
     def show_trace(self, ich):
         ''' Enable trace display on specific channel '''
         self.check_channel_index(ich)
-        self.write(f'C{ich}: TRA ON')
+        self.write(self.CHANNEL_COMMANDS[ich, 'TRA ON'])
     
     def hide_trace(self, ich):
         ''' Disable trace display on specific channel '''
         self.check_channel_index(ich)
-        self.write(f'C{ich}: TRA OFF')
+        self.write(self.CHANNEL_COMMANDS[ich, 'TRA OFF'])
     
     def is_trace(self, ich):
         ''' Query trace display on specific channel '''
         self.check_channel_index(ich)
-        out = self.query(f'C{ich}: TRA?')
-        return out.endswith('ON')
+        return self.query_reply(self.CHANNEL_COMMANDS[ich, 'TRA?'])
     
     def get_screen_binary_img(self):
         '''
@@ -193,46 +393,37 @@ class BK2555(Oscilloscope):
 
     def set_temporal_scale(self, value):
         ''' Set the temporal scale (in s/div) '''
-        # If not in set, replace with closest valid number (in log-distance)
-        if value not in self.TDIVS:
-            value = self.TDIVS[np.abs(np.log(self.TDIVS) - np.log(value)).argmin()]
-        self.log(f'setting time scale to {si_format(value, 2)}s/div')
+        # Replace with closest valid number (in log-distance)
+        value = self.get_closest_temporal_scale(value)
+        self.log('setting time scale to %ss/div', si_format(value, 2))
         self.write(f'TDIV {self.si_process(value)}S')
     
     def get_temporal_scale(self):
         ''' Get the temporal scale (in s/div) '''
-        out = self.query('TDIV?')
-        return self.process_float_mo(out, f'TDIV ({SI_REGEXP})([A-z]+)', 'temporal scale')
+        return self.query_reply('TDIV?')
     
     def set_vertical_scale(self, ich, value):
         ''' Set the vertical sensitivity of the specified channel (in V/div) '''
         self.check_channel_index(ich)
-        if value > self.MAX_VDIV:
-            logger.warning(
-                f'target vertical scale ({value} V/div) above instrument limit ({self.MAX_VDIV} V/div) -> restricting')
-            value = self.MAX_VDIV
-        self.log(f'setting channel {ich} vertical scale to {si_format(value, 2)}V/div')
+        value = self.check_vertical_scale(value)
+        self.log('setting channel %s vertical scale to %sV/div', ich, si_format(value, 2))
         self.write(f'C{ich}: VDIV {self.si_process(value)}V')
 
     def get_vertical_scale(self, ich):
         ''' Get the vertical sensitivity of the specified channel (in V/div) '''
         self.check_channel_index(ich)
-        out = self.query(f'C{ich}: VDIV?')
-        return self.process_float_mo(
-            out, f'C{ich}:VDIV ({SI_REGEXP})([A-z]+)', f'channel {ich} vertical scale')
+        return self.query_reply(self.CHANNEL_COMMANDS[ich, 'VDIV?'])
 
     def set_vertical_offset(self, ich, value):
         ''' Set the vertical offset of the specified channel (in V) '''
         self.check_channel_index(ich)
-        self.log(f'setting channel {ich} vertical offset to {si_format(value, 2)}V/div')
+        self.log('setting channel %s vertical offset to %sV/div', ich, si_format(value, 2))
         self.write(f'C{ich}: OFST {self.si_process(value)}V')
 
     def get_vertical_offset(self, ich):
         ''' Get the vertical offset of the specified channel (in V) '''
         self.check_channel_index(ich)
-        out = self.query(f'C{ich}: OFST?')
-        return self.process_float_mo(
-            out, f'C{ich}:OFST ({SI_REGEXP})([A-z]+)', f'channel {ich} vertical offset')
+        return self.query_reply(self.CHANNEL_COMMANDS[ich, 'OFST?'])
     
     # --------------------- FILTERS ---------------------
 
@@ -250,9 +441,8 @@ class BK2555(Oscilloscope):
         ''' Query bandwidth-limiting low-pass filter for specific channel '''
         self.check_channel_index(ich)
         out = self.query('BWL?')
-        bwl_rgxp = 'BWL ' + ','.join([f'C{c},(ON|OFF)' for c in self.CHANNELS])
-        mo = re.match(bwl_rgxp, out)
-        return mo.group(ich) == 'ON'
+        mo = self.BWL_PATTERN.match(out)
+        return mo.group(self.CHANNELS.index(ich) + 1) == 'ON'
     
     def set_filter(self, ich, ftype, flow=None, fhigh=None):
         '''
@@ -265,7 +455,7 @@ class BK2555(Oscilloscope):
         '''
         self.check_channel_index(ich)
         # Check filter type
-        if ftype not in self.FILTER_TYPES:
+        if ftype not in self.FILTER_TYPE_SET:
             raise VisaError(
                 f'invalid filter type: {ftype} (candidates are {self.FILTER_TYPES})')
         # Check frequency limits
@@ -288,72 +478,67 @@ class BK2555(Oscilloscope):
                     raise VisaError(
                         f'frequency lower limit ({flow} Hz) must be smaller than higher limit ({fhigh} Hz)')
         tdiv = self.get_temporal_scale()  # s/div
-        flims = np.asarray(self.FILTER_REL_LIMS) / tdiv  # Hz
+        flims = tuple(x / tdiv for x in self.FILTER_REL_LIMS)  # Hz
         flims_str = ' - '.join([f'{si_format(f, 1)}Hz' for f in flims])
         for k, f in {'flow': flow, 'fhigh': fhigh}.items():
             if f is not None:
-                if not is_within (f, flims):
+                if not flims[0] <= f <= flims[1]:
                     raise VisaError(
                         f'{k} value ({si_format(f, 1)}Hz) outside of frequency limits ({flims_str}) with current temporal scale ({si_format(tdiv, 1)}s/div)')
         fdict = {'flow': flow, 'fhigh': fhigh}
         fdict = {k: v for k, v in fdict.items() if v is not None}
-        fstr = ', '.join([f'{k} = {si_format(f, 1)}Hz' for k, f in fdict.items()])
-        self.log(f'setting {ftype} filter on channel {ich} with {fstr}')
+        if logger.isEnabledFor(logging.INFO):
+            fstr = ', '.join([f'{k} = {si_format(f, 1)}Hz' for k, f in fdict.items()])
+            self.log('setting %s filter on channel %s with %s', ftype, ich, fstr)
         # Generate instruction code
         s = f'C{ich}:FILTS TYPE,{ftype}'
         if flow is not None:
-            sf = si_format(flow, 1, space='').upper()
+            sf = fast_si_format(flow, 1).upper()
             s = f'{s},LOWLIMIT,{sf}Hz'
         if fhigh is not None:
-            sf = si_format(fhigh, 1, space='').upper()
+            sf = fast_si_format(fhigh, 1).upper()
             s = f'{s},UPPLIMIT,{sf}Hz'
         self.write(s)
     
     def enable_filter(self, ich):
         ''' Turn on filter on spefific channel trace '''
         self.check_channel_index(ich)
-        self.write(f'C{ich}: FILT ON')
+        self.write(self.CHANNEL_COMMANDS[ich, 'FILT ON'])
     
     def disable_filter(self, ich):
         ''' Turn off filter on spefific channel trace '''
         self.check_channel_index(ich)
-        self.write(f'C{ich}: FILT OFF')
+        self.write(self.CHANNEL_COMMANDS[ich, 'FILT OFF'])
     
     def is_filter_enabled(self, ich):
         ''' Check whether filter is enabled on spefific channel trace '''
         self.check_channel_index(ich)
-        out = self.query(f'C{ich}: FILT?')
-        mo = re.match(f'C{ich}:FILT (ON|OFF)', out)
-        return {'ON': True, 'OFF': False}[mo.group(1)]
+        return self.query_reply(self.CHANNEL_COMMANDS[ich, 'FILT?'])
     
     # --------------------- PROBES & COUPLING ---------------------
 
     def get_probe_attenuation(self, ich):
         ''' Get the vertical attenuation factor of a specific channel '''
         self.check_channel_index(ich)
-        out = self.query(f'C{ich}:ATTN?')
-        mo = re.match(f'C{ich}:ATTN ({INT_REGEXP})', out)
-        return float(mo[1])
+        return self.query_reply(self.CHANNEL_COMMANDS[ich, 'ATTN?'])
     
     def set_probe_attenuation(self, ich, value):
         ''' Set the vertical attenuation factor of a specific channel '''
         self.check_channel_index(ich)
-        self.log(f'setting channel {ich} probe attenuation factor to {value}')
+        self.log('setting channel %s probe attenuation factor to %s', ich, value)
         self.write(f'C{ich}:ATTN {value}')
 
     def get_coupling_mode(self, ich):
         ''' Get the coupling mode of a specific channel '''
-        out = self.query(f'C{ich}: CPL?')
-        mo = re.match(f'C{ich}:CPL ([A-z0-9]+)', out)
-        return mo[1]
+        return self.query_reply(self.CHANNEL_COMMANDS[ich, 'CPL?'])
 
     def set_coupling_mode(self, ich, value):
         ''' Set the coupling mode of a specific channel '''
         self.check_channel_index(ich)
-        if value not in self.COUPLING_MODES:
+        if value not in self.COUPLING_MODE_SET:
             raise VisaError(
                 f'invalid coupling mode: {value} (candidates are {self.COUPLING_MODES})')
-        self.log(f'setting channel {ich} coupling mode to {value}')
+        self.log('setting channel %s coupling mode to %s', ich, value)
         self.write(f'C{ich}: CPL {value}')
 
     # --------------------- CURSORS ---------------------
@@ -366,18 +551,13 @@ class BK2555(Oscilloscope):
         :param ctype: cursor type
         :param cpos: cursor position (in number of divisions)
         '''
-        # Check cursor type
-        if ctype not in self.CURSOR_TYPES:
+        # Check cursor type and retrieve associated position bounds
+        divbounds = self.CURSOR_DIV_BOUNDS.get(ctype)
+        if divbounds is None:
             raise VisaError(
                 f'invalid cursor type: {ctype} (candidates are {self.CURSOR_TYPES}')
         # Check cursor position
-        if ctype in ('HREF', 'HDIF'):
-            divbounds = (0.1, self.NHDIVS - 0.1)
-        elif ctype in ('TREF', 'TDIF'):
-            divbounds = (-self.NVDIVS / 2, self.NVDIVS / 2)
-        elif ctype in ('VREF', 'VDIF'):
-            divbounds = (-self.NHDIVS / 2, self.NHDIVS / 2)
-        if not is_within(cpos, divbounds):
+        if not divbounds[0] <= cpos <= divbounds[1]:
             raise VisaError(
                 f'invalid {ctype} cursor position: {cpos} (bounds are {divbounds})')
         
@@ -392,11 +572,11 @@ class BK2555(Oscilloscope):
         :return: cursor position (in number of divisions)
         '''
         # Check cursor type
-        if ctype not in self.CURSOR_TYPES:
+        if ctype not in self.CURSOR_TYPE_SET:
             raise VisaError(
                 f'invalid cursor type: {ctype} (candidates are {self.CURSOR_TYPES}')
         out = self.query(f'C{ich}: CRST? {ctype}')
-        mo = re.match(f'C{ich}:CRST {ctype},({FLOAT_REGEXP})', out)
+        mo = self.CRST_PATTERN.match(out)
         return float(mo.group(1))
 
     def get_cursor_value(self, ich, ctype):
@@ -408,17 +588,12 @@ class BK2555(Oscilloscope):
         :return: cursor value(s)
         '''
         # Check cursor type
-        if ctype not in self.CVALUES_TYPES:
+        if ctype not in self.CVALUES_TYPE_SET:
             raise VisaError(
                 f'invalid cursor type for value extraction: {ctype} (candidates are {self.CVALUES_TYPES}')
         out = self.query(f'C{ich}: CRVA? {ctype}')
         # Parser output depending on cursor type
-        out_rgxp = f'C{ich}:CRVA {ctype}'
-        if ctype == 'HREL':
-            out_rgxp = f'{out_rgxp},({SI_REGEXP}),({SI_REGEXP}),({SI_REGEXP}),({FLOAT_REGEXP})'
-        else:
-            out_rgxp = f'{out_rgxp},({SI_REGEXP})'
-        mo = re.match(out_rgxp, out)
+        mo = self.CRVA_PATTERNS[ctype].match(out)
         # Return cursor value(s)
         outs = [float(x) for x in mo.groups()]
         return outs
@@ -431,13 +606,12 @@ class BK2555(Oscilloscope):
 
     def get_trigger_mode(self):
         ''' Get trigger mode '''
-        out = self.query('TRMD?')
-        return re.match('TRMD ([A-z]+)', out)[1]
+        return self.query_reply('TRMD?')
      
     def set_trigger_mode(self, value):
         ''' Set trigger mode '''
         value = value.upper()
-        if value not in self.TRIGGER_MODES:
+        if value not in self.TRIGGER_MODE_SET:
             raise VisaError(
                 f'{value} not a valid trigger mode (candidates are {self.TRIGGER_MODES})')
         self.write(f'TRMD {value}')
@@ -449,27 +623,30 @@ class BK2555(Oscilloscope):
     def get_trigger_coupling_mode(self, ich):
         ''' Get the trigger coupling of the selected source. '''
         self.check_channel_index(ich)
-        out = self.query(f'C{ich}: TRCP?')
-        return re.match(f'C{ich}:TRCP ([A-z]+)', out)[1]
+        return self.query_reply(self.CHANNEL_COMMANDS[ich, 'TRCP?'])
     
     def set_trigger_coupling_mode(self, ich, value):
         ''' Set the trigger coupling of the selected source. '''
         self.check_channel_index(ich)
-        if value not in self.TRIGGER_COUPLING_MODES:
+        if value not in self.TRIGGER_COUPLING_MODE_SET:
             raise VisaError(
                 f'{value} not a valid trigger coupling mode (candidates are {self.TRIGGER_COUPLING_MODES})')
         self.write(f'C{ich}: TRCP {value}')
 
     def get_trigger_type(self):
         ''' Get trigger type '''
-        return self.get_trigger_options()['type']
+        # Cached until next write (and re-seeded by trigger setters), assuming the
+        # trigger type is not changed on the front panel in between
+        return self.cached_query(
+            'TRSE?', lambda out: self.parse_trigger_options(out)['type'], raw=True)
     
     def set_trigger_type(self, val):
         ''' Set trigger type '''
-        if val not in self.TRIG_TYPES:
+        if val not in self.TRIG_TYPE_SET:
             raise VisaError(
                 f'{val} not a valid trigger types. Candidates are {self.TRIG_TYPES}')
         self.write(f'TRSE {val}')
+        self.cache_reply('TRSE?', val)
     
     def get_trigger_source(self):
         ''' Get trigger source channel index '''
@@ -478,37 +655,40 @@ class BK2555(Oscilloscope):
     def set_trigger_source(self, ich):
         ''' Set trigger source channel index '''
         self.check_channel_index(ich)
-        self.log(f'setting trigger source to channel {ich}')
+        self.log('setting trigger source to channel %s', ich)
         ttype = self.get_trigger_type()
         self.write(f'TRSE {ttype},SR,C{ich}')
+        self.cache_reply('TRSE?', ttype)
     
     def get_trigger_slope(self, ich):
         ''' Get trigger slope of a particular trigger source '''
         self.check_channel_index(ich)
-        out = self.query(f'C{ich}: TRSL?')
-        return re.match(f'C{ich}:TRSL ([A-z]+)', out)[1]
+        return self.query_reply(self.CHANNEL_COMMANDS[ich, 'TRSL?'])
     
-    def set_trigger_slope(self, ich, value):
-        ''' Set trigger slope of a particular trigger source '''
-        self.check_channel_index(ich)
+    def check_trigger_slope(self, value):
+        ''' Check that trigger slope value is valid, and return its normalized form '''
         value = value.upper()
-        if value not in self.TRIGGER_SLOPES:
+        if value not in self.TRIGGER_SLOPE_SET:
             raise VisaError(
                 f'{value} not a valid trigger slope (candidates are {self.TRIGGER_SLOPES})')
-        self.log(f'setting channel {ich} trigger slope to {value}')
+        return value
+
+    def set_trigger_slope(self, ich, value):
+        ''' Set trigger slope of a particular trigger source '''
+        self.check_channel_index(ich)
+        value = self.check_trigger_slope(value)
+        self.log('setting channel %s trigger slope to %s', ich, value)
         self.write(f'C{ich}: TRSL {value}')
 
     def get_trigger_level(self, ich):
         ''' Get the trigger level of the specified trigger source (in V) '''
         self.check_channel_index(ich)
-        out = self.query(f'C{ich}:TRLV?')
-        return self.process_float_mo(
-            out, f'C{ich}:TRLV ({SI_REGEXP})([A-z]+)', f'channel {ich} trigger level')
+        return self.query_reply(self.CHANNEL_COMMANDS[ich, 'TRLV?'])
 
     def set_trigger_level(self, ich, value):
         ''' Set the trigger level of the specified trigger source (in V) '''
         self.check_channel_index(ich)
-        self.log(f'setting channel {ich} trigger level to {si_format(value, 2)}V')
+        self.log('setting channel %s trigger level to %sV', ich, si_format(value, 2))
         self.write(f'C{ich}:TRLV {self.si_process(value)}V')
 
     def set_trigger_halfamp(self):
@@ -520,27 +700,26 @@ class BK2555(Oscilloscope):
     
     def get_trigger_delay(self):
         ''' Get trigger delay (in s) '''
-        out = self.query('TRDL?')
-        return self.process_float_mo(out, f'TRDL ({FLOAT_REGEXP})([A-z]+)', 'trigger delay')
+        return self.query_reply('TRDL?')
 
     def set_trigger_delay(self, value):
         ''' Set trigger delay (in s) '''
         value = self.check_trigger_delay(value)
-        self.log(f'setting trigger time delay to {si_format(value, 2)}s')
+        self.log('setting trigger time delay to %ss', si_format(value, 2))
         self.write(f'TRDL {self.si_process(value)}S')
 
     def get_trigger_options(self):
         ''' Get trigger type and options '''
-        out = self.query(f'TRIG_SELECT?')
-        tt_opts = '|'.join(self.TRIG_TYPES)
-        ht_opts = '|'.join(self.HOLD_TYPES)
-        mo = re.match(
-            f'TRSE ({tt_opts}),SR,C({INT_REGEXP}),HT,({ht_opts}),HV,({FLOAT_REGEXP})([A-z]+)', out)
+        return self.parse_trigger_options(self.query_raw('TRIG_SELECT?'))
+
+    def parse_trigger_options(self, out):
+        ''' Parse trigger options reply into a dictionary '''
+        mo = self.TRSE_PATTERN.match(out)
         return {
-            'type': mo[1],
+            'type': mo[1].decode('ascii'),
             'source': int(mo[2]),
-            'hold_type': mo[3],
-            'hold_val': self.process_float(float(mo[4]), mo[5])
+            'hold_type': mo[3].decode('ascii'),
+            'hold_val': self.process_float(float(mo[4]), mo[5].decode('ascii'))
         }
 
     def force_trigger(self):
@@ -558,17 +737,12 @@ class BK2555(Oscilloscope):
 
     def get_interpolation_type(self):
         ''' Get the type of waveform interpolation (linear or sine) '''
-        out = self.query('SXSA?')
-        mo = re.match('(SXSA) (ON|OFF)', out)
-        _, SXSA = mo.groups()
-        return {
-            'ON': 'sine',
-            'OFF': 'linear'
-        }[SXSA]
+        is_sine = self.query_reply('SXSA?')
+        return 'sine' if is_sine else 'linear'
     
     def set_interpolation_type(self, value):
         ''' Set the type of waveform interpolation (linear or sine) '''
-        if value not in self.INTERP_TYPES:
+        if value not in self.INTERP_TYPE_SET:
             raise ValueError(
                 f'invalid interpolation type: {value} (candidates are {self.INTERP_TYPES})')
         SXSA = {
@@ -579,12 +753,11 @@ class BK2555(Oscilloscope):
     
     def get_nsweeps_per_acquisition(self):
         ''' Get the number of samples to average from for average acquisition.'''
-        out = self.query('AVGA?')
-        return self.process_int_mo(out, f'AVGA ({INT_REGEXP})', '#sweeps/acquisition')
+        return self.query_reply('AVGA?')
     
     def set_nsweeps_per_acquisition(self, value):
         ''' Set the number of samples to average from for average acquisition.'''
-        if value not in self.NAVGS:
+        if value not in self.NAVG_SET:
             raise VisaError(f'Not a valid number of sweeps. Candidates are {self.NAVGS}')
         if value == 1:
             self.set_acquisition_type('SAMPLING')
@@ -594,21 +767,18 @@ class BK2555(Oscilloscope):
     
     def get_acquisition_status(self):
         ''' Get the acquisition status of the oscilloscope '''
-        out = self.query('SAST?')
-        mo = re.match('SAST (.+)', out)
-        return mo[1]
+        return self.query_reply('SAST?')
     
     def get_sample_rate(self):
         ''' Get the acquisition sampling rate (in samples/second) '''
-        out = self.query('SARA?')
-        return self.process_float_mo(out, f'SARA ({FLOAT_REGEXP})([A-z]+)', 'sample rate')
+        # Follows front-panel time base changes -> only cache it briefly
+        return self.cached_query(
+            'SARA?', lambda out: self.parse_reply(out, expected='SARA'), ttl=self.SARA_CACHE_TTL)
     
     def get_nsamples(self, ich):
         ''' Get the number of samples in last acquisition in a specific channel '''
         self.check_channel_index(ich)
-        out = self.query(f'SANU? C{ich}')
-        mo = re.match(f'SANU ({INT_REGEXP})', out)
-        return int(mo[1])
+        return self.query_reply(f'SANU? C{ich}')
 
     def enable_peak_detector(self):
         ''' Turn on peak detector '''
@@ -620,15 +790,12 @@ class BK2555(Oscilloscope):
 
     def get_acquisition_type(self):
         ''' Get oscilloscope acquisition type '''
-        out = self.query('ACQW?')
-        mo = re.match('(ACQW) (AVERAGE,?\d*|SAMPLING|PEAK_DETECT)', out)
-        _, acqtype = mo.groups()
-        return acqtype
+        return self.query_reply('ACQW?')
     
     def set_acquisition_type(self, value):
         ''' Set oscilloscope acquisition type '''
         value = value.upper()
-        if value not in self.ACQ_TYPES:
+        if value not in self.ACQ_TYPE_SET:
             raise ValueError(
                 f'invalid acquisition type: {value} (candidates are {self.ACQ_TYPES})')
         if value == 'AVERAGE':
@@ -644,12 +811,28 @@ class BK2555(Oscilloscope):
         out = self.query(f'C{ich}: PAVA? {pkey}')
         if '****' in out:
             raise VisaError(f'could not extract {pkey} from channel {ich}')
-        if out.endswith('%'):
-            return self.process_float_mo(
-                out, f'C{ich}:PAVA {pkey},({FLOAT_REGEXP})(%)', f'channel {ich} {pkey}')
-        else:
-            return self.process_float_mo(
-                out, f'C{ich}:PAVA {pkey},({SI_REGEXP})([A-z]+)', f'channel {ich} {pkey}')
+        return self.process_float_mo(out, self.PAVA_PATTERN, f'channel {ich} {pkey}')
+
+    def get_parameter_values(self, ich, pkeys):
+        '''
+        Query the values of several parameters on a particular channel, in a single
+        compound query
+
+        :param ich: channel index
+        :param pkeys: list of parameter keys (e.g. ['FREQ', 'AMPL', 'PKPK'])
+        :return: dictionary of (parameter key: value) pairs
+        '''
+        self.check_channel_index(ich)
+        out = self.query(';'.join(f'C{ich}:PAVA? {pkey}' for pkey in pkeys)).split(';')
+        if len(out) != len(pkeys):
+            raise VisaError(f'expected {len(pkeys)} parameter values, got {len(out)} ("{";".join(out)}")')
+        values = {}
+        for pkey, o in zip(pkeys, out):
+            o = o.strip()
+            if '****' in o:
+                raise VisaError(f'could not extract {pkey} from channel {ich}')
+            values[pkey] = self.process_float_mo(o, self.PAVA_PATTERN, f'channel {ich} {pkey}')
+        return values
     
     def get_frequency(self, ich):
         ''' Get the waveform frequency on a particular channel '''
@@ -684,8 +867,14 @@ class BK2555(Oscilloscope):
         
         :return: 3-tuple with (sparsing, number of points, and position of the 1st point)
         '''
-        out = self.query('WAVEFORM_SETUP?')
-        mo = re.match('WFSU SP,([0-9]+),NP,([0-9]+),FP,([0-9]+),SN,([0-9]+)', out)
+        # WFSU has no front-panel counterpart, but may be reset by a front-panel default
+        # setup (or rewritten by another remote client) -> bound cache staleness
+        return self.cached_query(
+            'WAVEFORM_SETUP?', self.parse_waveform_settings, raw=True, ttl=self.WFSU_CACHE_TTL)
+
+    def parse_waveform_settings(self, out):
+        ''' Parse waveform settings reply into (sparsing, number of points, position of the 1st point, segment index) '''
+        mo = self.WFSU_PATTERN.match(out)
         sp, npoints, fp, si = [int(x) for x in mo.groups()]
         return sp, npoints, fp, si
     
@@ -706,10 +895,48 @@ class BK2555(Oscilloscope):
         '''
         self.write(f'WFSU SP,{sp}, NP,{npoints}, FP,{fp}')
     
-    def get_waveform_template(self):
-        ''' Get a template description of the various logical entities making up a complete waveform.'''
+    def get_template_cache_file(self):
+        ''' Get the path to the waveform template cache file of the connected instrument '''
+        idn = self.get_idn()
+        if idn is None:
+            return None
+        key = re.sub('[^A-Za-z0-9]+', '_', idn).strip('_')
+        return os.path.join(self.TEMPLATE_CACHE_DIR, f'bk_2555_tmpl_{key}.txt')
+
+    def get_waveform_template(self, use_cache=True):
+        '''
+        Get a template description of the various logical entities making up a complete waveform.
+
+        :param use_cache: whether to read the template from (and write it to) a disk cache
+            file specific to the connected instrument, to avoid re-querying it on every session
+        :return: waveform template string
+        '''
+        fpath = self.get_template_cache_file() if use_cache else None
+        # Load template from cache file, if any
+        if fpath is not None and os.path.isfile(fpath):
+            try:
+                with open(fpath, encoding='utf8') as f:
+                    return f.read()
+            except OSError as err:
+                logger.warning('could not read waveform template cache file: %s', err)
+        # Otherwise, query template from instrument
         out = self.query('TMPL?')
-        return out[8:-5]
+        tmpl = out[8:-5]
+        # Save template to cache file (failure to do so is not critical)
+        if fpath is not None:
+            try:
+                os.makedirs(self.TEMPLATE_CACHE_DIR, exist_ok=True)
+                with open(fpath, 'w', encoding='utf8') as f:
+                    f.write(tmpl)
+            except OSError as err:
+                logger.warning('could not write waveform template cache file: %s', err)
+        return tmpl
+
+    def invalidate_template_cache(self):
+        ''' Delete the waveform template cache file of the connected instrument, if any '''
+        fpath = self.get_template_cache_file()
+        if fpath is not None and os.path.isfile(fpath):
+            os.remove(fpath)
     
     def get_comunication_format(self):
         '''
@@ -717,11 +944,15 @@ class BK2555(Oscilloscope):
         
         :return: 3-tuple with (block_format, data_type, encoding)
         '''
-        out = self.query('COMM_FORMAT?')
-        mo = re.match('^CFMT (DEF9|IND0|OFF),(BYTE|WORD),(BIN|HEX)$', out)
-        bfmt = mo[1]
-        dtype = mo[2]
-        enc = mo[3]
+        # CFMT only governs remote transfers and is not exposed on the front panel, so the
+        # cached reply mostly holds, barring another remote client writing it
+        return self.cached_query(
+            'COMM_FORMAT?', self.parse_comunication_format, raw=True, ttl=self.CFMT_CACHE_TTL)
+
+    def parse_comunication_format(self, out):
+        ''' Parse communication format reply into (block_format, data_type, encoding) '''
+        mo = self.CFMT_PATTERN.match(out)
+        bfmt, dtype, enc = [x.decode('ascii') for x in mo.groups()]
         return bfmt, dtype, enc
 
     @property
@@ -733,60 +964,52 @@ class BK2555(Oscilloscope):
         return '\n'.join(l)
 
     @staticmethod
-    def extract_from_bytes(bytes, istart, dtype='f'):
+    def extract_from_bytes(buffer, istart, dtype='f'):
         '''
         Extract a field from the binary waveform header
         
-        :param bytes: list of bytes representing the waveform header
+        :param buffer: bytes buffer representing the waveform header
         :param istart: start position of the field of interest
         :param dtype: data type of the field of interest
         :return: value of the field of interest
         '''
-        # Deduce field size (in bytes) from data type
-        s = {'f': 4, 'd': 8, 'l': 4}[dtype]
-        
-        # Extract binary segment
-        fbin = b''.join(bytes[istart:istart + s])
-        
-        # Convert and return
-        return struct.unpack(dtype, fbin)[0]
+        # Unpack field directly from buffer (little-endian, standard sizes)
+        return struct.unpack_from(f'<{dtype}', buffer, istart)[0]
 
-    def get_waveform_data(self, ich):
+    def fetch_waveform(self, ich):
         '''
-        Get waveform data from a specific channel
+        Fetch raw waveform samples and scaling parameters from a specific channel
         
         :param ich: channel index
-        :return: 2-tuple of numpy arrays with:
-            - t: time signal (s)
-            - y: waveform signal (V)
+        :return: 5-tuple with:
+            - y: raw signed 8-bit waveform samples
+            - vgain: vertical gain (V/sample unit)
+            - voff: vertical offset (V)
+            - dt: sampling interval (s)
+            - hoff: horizontal offset (s)
         '''
         # Check channel index
         self.check_channel_index(ich)
         
-        # Retrieve meta data
-        meta = self.query_binary_values(f'C{ich}:WF? DESC', datatype='c')
-        
-        # Extract number of sweeps per acquisition
-        nsweeps_per_acq = self.extract_from_bytes(meta, istart=148, dtype='l')
-        logger.debug(f'# sweeps/acq: {nsweeps_per_acq}')
+        # Retrieve meta data as a single contiguous bytes buffer
+        meta = self.query_binary_values(
+            f'C{ich}:WF? DESC', datatype='B', container=bytes)
         
-        # Extract amplitude scale factor and amplitude offset
-        vgain = self.extract_from_bytes(meta, istart=156)
-        logger.debug(f'vertical gain: {vgain:.5e}')
-        voff = self.extract_from_bytes(meta, istart=160)
-        logger.debug(f'vertical offset: {voff:.5f} V')
+        # Extract number of sweeps per acquisition, amplitude scale factor and offset,
+        # sampling interval and horizontal offset, in a single unpacking pass
+        nsweeps_per_acq, vgain, voff, dt, hoff = self.WAVEDESC_STRUCT.unpack_from(
+            meta, self.WAVEDESC_OFFSET)
+        logger.debug('# sweeps/acq: %s', nsweeps_per_acq)
+        logger.debug('vertical gain: %.5e', vgain)
+        logger.debug('vertical offset: %.5f V', voff)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('sampling interval: %ss', si_format(dt, 3))
+        logger.debug('horizontal offset: %s s', hoff)
         
-        # Get sampling interval and horizontal offset
-        dt = self.extract_from_bytes(meta, istart=176)
-        logger.debug(f'sampling interval: {si_format(dt, 3)}s')
-        hoff = self.extract_from_bytes(meta, istart=180, dtype='d')
-        logger.debug(f'horizontal offset: {hoff} s')
-        
-        # Extract waveform data
-        y = self.query_binary_values(
-            f'C{ich}:WF? DAT2',
-            container=np.ndarray,
-            datatype='b')
+        # Extract waveform data: locate IEEE 488.2 block header (#<len_len><len>)
+        # in raw answer, and map signed 8-bit samples directly onto a numpy array
+        raw, offset, nbytes = self.read_data_block(f'C{ich}:WF? DAT2')
+        y = np.frombuffer(raw, dtype=np.int8, count=nbytes, offset=offset)
         
         # Compare data length to expected number of points
         expected_npoints = self.get_waveform_settings()[1]
@@ -794,11 +1017,101 @@ class BK2555(Oscilloscope):
             raise VisaError(
                 f'waveform parsing error: waveform size ({y.size}) does not correspond to expected number of points ({expected_npoints})')
         
-        # Rescale waveform
-        y = y * vgain - voff  # V
+        # Return
+        return y, vgain, voff, dt, hoff
+
+    def read_data_block(self, text):
+        '''
+        Query an IEEE 488.2 definite-length binary block, reading until it is complete
         
-        # Get time vector
-        t = np.arange(y.size) * dt + hoff  # s
+        :param text: query text
+        :return: 3-tuple with raw answer, offset of the block data and its size (in bytes)
+        '''
+        # Query and read answer atomically, since it may span several reads
+        with self.locked():
+            raw = self.query_raw(text)
+            # Parse block header (#<len_len><len>)
+            istart = raw.find(b'#')
+            nlendigits = raw[istart + 1:istart + 2]
+            if istart < 0 or not nlendigits.isdigit() or nlendigits == b'0':
+                raise VisaError(f'malformed binary block header in "{text}" answer')
+            offset = istart + 2 + int(nlendigits)
+            nbytes = raw[istart + 2:offset]
+            if len(nbytes) != int(nlendigits) or not nbytes.isdigit():
+                raise VisaError(f'malformed binary block header in "{text}" answer')
+            nbytes = int(nbytes)
+            # Keep reading until block is complete (e.g. upon short or chunked reads)
+            chunks, nread = [raw], len(raw)
+            while nread < offset + nbytes:
+                chunk = self.read_raw()
+                if not chunk:
+                    raise VisaError(
+                        f'incomplete binary block in "{text}" answer ({nread - offset}/{nbytes} bytes)')
+                chunks.append(chunk)
+                nread += len(chunk)
+        if len(chunks) > 1:
+            raw = b''.join(chunks)
+        return raw, offset, nbytes
+
+    def get_sample_indexes(self, n):
+        ''' Get a (cached) float vector of the first n sample indexes '''
+        indexes = self._sample_indexes
+        if indexes.size < n:
+            indexes = np.arange(n, dtype=np.float64)
+            self._sample_indexes = indexes
+        return indexes[:n]
+
+    def get_waveform_data(self, ich, dtype=np.float32):
+        '''
+        Get waveform data from a specific channel
+        
+        :param ich: channel index
+        :param dtype: floating point type of the output waveform signal (the instrument
+            ADC resolution is 8 bits, hence single precision is sufficient by default)
+        :return: 2-tuple of numpy arrays with:
+            - t: time signal (s)
+            - y: waveform signal (V)
+        '''
+        # Fetch raw waveform
+        y, vgain, voff, dt, hoff = self.fetch_waveform(ich)
+        
+        # Rescale waveform in a single preallocated buffer of the requested type
+        yscaled = np.empty(y.size, dtype=dtype)
+        np.multiply(y, vgain, out=yscaled, dtype=dtype)
+        np.subtract(yscaled, voff, out=yscaled)  # V
+        y = yscaled
+        
+        # Get time vector, scaled and shifted in place
+        t = np.arange(y.size, dtype=np.float64)
+        t *= dt
+        t += hoff  # s
         
         # Return
         return t, y
+
+    def get_waveform_data_into(self, ich, out_t, out_y):
+        '''
+        Get waveform data from a specific channel into caller-owned buffers, e.g. to
+        avoid re-allocating arrays across repeated acquisitions
+        
+        :param ich: channel index
+        :param out_t: preallocated 1D float array receiving the time signal (s)
+        :param out_y: preallocated 1D float array receiving the waveform signal (V)
+        :return: number of samples written to the buffers
+        '''
+        # Fetch raw waveform and check that it fits into output buffers
+        y, vgain, voff, dt, hoff = self.fetch_waveform(ich)
+        n = y.size
+        if out_t.size < n or out_y.size < n:
+            raise VisaError(
+                f'output buffers too small ({out_t.size}, {out_y.size}) for waveform size ({n})')
+        
+        # Rescale waveform and compute time vector in place
+        yview, tview = out_y[:n], out_t[:n]
+        np.multiply(y, vgain, out=yview, dtype=out_y.dtype)
+        np.subtract(yview, voff, out=yview)  # V
+        np.multiply(self.get_sample_indexes(n), dt, out=tview)
+        np.add(tview, hoff, out=tview)  # s
+        
+        # Return number of samples
+        return n
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+
+''' Instrument-specific exception classes (free of any communication backend dependency). '''
+
+
+class VisaError(Exception):
+    ''' Custom exception class for VISA instrument '''
+    pass
+
+
+class SutterError(Exception):
+    ''' Custom exception class for Sutter instrument '''
+    pass
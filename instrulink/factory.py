@@ -4,32 +4,133 @@
 # @Last Modified by:   Theo Lemaire
 # @Last Modified time: 2023-10-03 09:54:40
 
-from .rigol_dg1022z import RigolDG1022Z
-from .rigol_ds1054z import RigolDS1054Z
-from .bk_2555 import BK2555
-from .sutter_mp285a import SutterMP285A, SutterError
-from .visa_instrument import VisaError
+import importlib
+from collections.abc import MutableMapping
+
+from .errors import VisaError, SutterError
 from .logger import logger
 
 ''' High-level interface functions to access lab instruments. '''
 
+__all__ = [
+    'InstrumentRegistry',
+    'generator_classes',
+    'oscilloscope_classes',
+    'manipulator_classes',
+    'register_generator',
+    'register_oscilloscope',
+    'register_manipulator',
+    'grab_instrument',
+    'grab_generator',
+    'grab_oscilloscope',
+    'grab_manipulator',
+]
+
+
+def load_instrument_class(location):
+    '''
+    Import instrument class from its location
+    
+    :param location: "module:class" string (with module either absolute, or relative
+        to the package if starting with a dot), or instrument class
+    :return: instrument class
+    '''
+    if not isinstance(location, str):
+        return location
+    modname, clsname = location.split(':')
+    module = importlib.import_module(modname, __package__)
+    return getattr(module, clsname)
+
+
+class InstrumentRegistry(MutableMapping):
+    '''
+    Dictionary of instrument classes, stored as "module:class" locations (or classes),
+    and imported only upon access, to avoid loading unused instrument backends
+    '''
+
+    def __init__(self, locations=None):
+        self.locations = {}
+        for key, location in (locations or {}).items():
+            self[key] = location
+
+    def __getitem__(self, key):
+        return load_instrument_class(self.locations[key])
+
+    def __setitem__(self, key, location):
+        if isinstance(location, str) and location.count(':') != 1:
+            raise ValueError(f'Invalid instrument class location: "{location}" (expected "module:class")')
+        self.locations[key] = location
+
+    def __delitem__(self, key):
+        del self.locations[key]
+
+    def __iter__(self):
+        return iter(self.locations)
+
+    def __len__(self):
+        return len(self.locations)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.locations})'
+
+
 # Dictionary of available waveform generator classes
-generator_classes = {
-    'rigol': RigolDG1022Z
-}
+generator_classes = InstrumentRegistry({
+    'rigol': '.rigol_dg1022z:RigolDG1022Z'
+})
 
 # Dictionary of available oscilloscope classes
-oscilloscope_classes = {
-    'bk': BK2555,
-    'rigol': RigolDS1054Z
-}
+oscilloscope_classes = InstrumentRegistry({
+    'bk': '.bk_2555:BK2555',
+    'rigol': '.rigol_ds1054z:RigolDS1054Z'
+})
 
 # Dictionary of available micro-manipulator classes
-manipulator_classes = {
-    'sutter': SutterMP285A
+manipulator_classes = InstrumentRegistry({
+    'sutter': '.sutter_mp285a:SutterMP285A'
+})
+
+# Locations of built-in instrument classes, exposed as lazy module attributes
+builtin_classes = {
+    location.split(':')[1]: location
+    for instdict in (generator_classes, oscilloscope_classes, manipulator_classes)
+    for location in instdict.locations.values()
 }
 
 
+def __getattr__(name):
+    ''' Resolve built-in instrument classes upon first access '''
+    if name in builtin_classes:
+        return load_instrument_class(builtin_classes[name])
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def register_instrument(instdict, key, location):
+    '''
+    Register an instrument class under a given key
+    
+    :param instdict: dictionary of instrument classes for a specific type
+    :param key: instrument key
+    :param location: "module:class" string (e.g. "mypackage.mymodule:MyScope"), or instrument class
+    '''
+    instdict[key] = location
+
+
+def register_generator(key, location):
+    ''' Register waveform generator class '''
+    register_instrument(generator_classes, key, location)
+
+
+def register_oscilloscope(key, location):
+    ''' Register oscilloscope class '''
+    register_instrument(oscilloscope_classes, key, location)
+
+
+def register_manipulator(key, location):
+    ''' Register micro-manipulator class '''
+    register_instrument(manipulator_classes, key, location)
+
+
 def grab_instrument(type, instdict, key=None):
     ''' 
     Generic function to grab instrument object.
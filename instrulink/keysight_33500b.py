@@ -180,10 +180,11 @@ class Keysight33500B(WaveformGenerator):
 
     def single_pulse(self):
         self.log('sending single pulse...')
-        self.set_trigger_source('BUS')
-        self.enable_output()
-        self.trigger()
-        self.wait()
+        with self.locked():
+            self.set_trigger_source('BUS')
+            self.enable_output()
+            self.trigger()
+            self.wait()
     
     def wait_for_external_trigger(self):
         self.log('waiting for external trigger...')
@@ -1,19 +1,30 @@
 
+import math
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from nidaqmx.constants import TaskMode
 from nidaqmx.system import System
 from nidaqmx.system.device import Device
 from nidaqmx.task import Task
-import numpy as np
 
 from .logger import logger
 
 
+@lru_cache(maxsize=1)
 def get_nidaq_device_names():
-    '''  Get NI DAQ device names list '''
-    return System().devices.device_names
+    '''  Get NI DAQ device names list (cached, see refresh_nidaq_cache) '''
+    return tuple(System().devices.device_names)
 
+@lru_cache(maxsize=8)
 def get_nidaq_terminals(device_name):
-    ''' Get NI DAQ device output terminals list '''
-    return Device(device_name).terminals
+    ''' Get NI DAQ device output terminals list (cached, see refresh_nidaq_cache) '''
+    return tuple(Device(device_name).terminals)
+
+def refresh_nidaq_cache():
+    ''' Clear cached NI DAQ device names and terminals (e.g. upon hardware change) '''
+    get_nidaq_device_names.cache_clear()
+    get_nidaq_terminals.cache_clear()
 
 
 def get_nidaq_tasks():
@@ -27,11 +38,18 @@ class PulseTrainGenerator:
     '''
 
     timeout = 5
+    __slots__ = (  # fixed instance attributes (no per-instance __dict__)
+        '_device_name', '_input_PFI', '_output_PFI', '_task_name', '_freq', '_duty_cycle',
+        '_initial_delay', '_npulses', '_task', '_written', '_defer_updates',
+        '_input_terminal', '_output_terminal', '_output_channel')
+    _BATCH_ATTRS = (  # instance attributes restored if a batch of updates fails
+        '_device_name', '_input_PFI', '_output_PFI', '_task_name', '_freq', '_duty_cycle',
+        '_initial_delay', '_npulses', '_input_terminal', '_output_terminal', '_output_channel')
 
     ######################### CONSTRUCTORS & DESTRUCTORS #########################
 
     def __init__(self, device_name=None, input_PFI=0, output_PFI=1, task_name=None, 
-                 freq=1., duty_cycle=0.5, initial_delay=0, npulses=1):
+                 freq=1., duty_cycle=0.5, initial_delay=0, npulses=1, defer_task=False):
         '''
         Constructor
 
@@ -42,29 +60,38 @@ class PulseTrainGenerator:
         :param duty_cycle: width of pulses divided by the inter-pulse period.
         :param initial_delay: time in seconds to wait before generating the first pulse.
         :param npulses: number of pulses to generate
+        :param defer_task: whether to defer the creation of the underlying task to
+            a later call to `create_task` (e.g. to configure several generators concurrently
+            via `create_tasks`)
         '''
-        # DAQ parameters 
-        self.device_name = device_name
-        self.input_PFI = input_PFI
-        self.output_PFI = output_PFI
+        # Underlying task (created after all parameters are set), and flag
+        # indicating whether property propagation to it is deferred
+        self._task = None
+        self._defer_updates = False
+        # DAQ parameters (PFI slots validated and assigned directly, since there is
+        # no task to propagate them to yet)
+        self._input_PFI = None if input_PFI is None else self.validate_int('input_PFI', input_PFI)
+        self._output_PFI = None if output_PFI is None else self.validate_int('output_PFI', output_PFI)
+        self.device_name = device_name  # (also builds terminal & channel names)
         self.task_name = task_name
-        # Pulse train parameters
-        self.freq = freq
-        self.duty_cycle = duty_cycle
-        self.initial_delay = initial_delay
-        self.npulses = npulses
-        # Create task
-        self.create_task()
+        # Pulse train parameters (idem)
+        self._freq = self.validate_float('freq', freq)
+        self._duty_cycle = self.validate_float('duty_cycle', duty_cycle)
+        self._initial_delay = self.validate_float('initial_delay', initial_delay)
+        self._npulses = self.validate_int('npulses', npulses)
+        # Create task, unless deferred
+        if not defer_task:
+            self.create_task()
         # Log upon creation
         logger.info(f'created {self}')
     
     def __del__(self):
         ''' Destructor '''
         # Close underlying task
-        if hasattr(self, '_task'):
+        if self._task is not None:
             logger.info(f'closing {self.task_name} task ...')
             self._task.close()
-            del(self._task)
+            self._task = None
     
     def __repr__(self):
         return f'{self.__class__.__name__}({self.device_name}, PFI_in={self.input_PFI}, PFI_out={self.output_PFI}, freq={self.freq:.2f}Hz, delay={self.initial_delay:.2f}s, npulses={self.npulses})'
@@ -72,14 +99,29 @@ class PulseTrainGenerator:
     ######################### GETTERS & SETTERS #########################
 
     @staticmethod
-    def validate_attribute(key, val, dtype=float):
-        if not isinstance(val, dtype):
-            if dtype == float and isinstance(val, int):
-                val = float(val)
-            else:
-                raise ValueError(f'{key} is not a {dtype}')
-        if val < 0 or val == np.inf:
+    def validate_float(key, val):
+        ''' Validate a positive finite float attribute (ints accepted) and return it as float '''
+        if not isinstance(val, (float, int)):
+            raise ValueError(f'{key} is not a {float}')
+        if not 0 <= val < math.inf:
             raise ValueError(f'{key} must be a positive finite scalar')
+        return float(val)
+
+    @staticmethod
+    def validate_int(key, val):
+        ''' Validate a positive integer attribute and return it '''
+        if not isinstance(val, int):
+            raise ValueError(f'{key} is not a {int}')
+        if val < 0:
+            raise ValueError(f'{key} must be a positive finite scalar')
+        return val
+
+    @classmethod
+    def validate_attribute(cls, key, val, dtype=float):
+        ''' Validate attribute of a given type (float or int) and return it '''
+        if dtype is float:
+            return cls.validate_float(key, val)
+        return cls.validate_int(key, val)
 
     @property
     def device_name(self):
@@ -90,6 +132,9 @@ class PulseTrainGenerator:
         if val is None:
             val = get_nidaq_device_names()[0]
         self._device_name = val
+        # Rebuild derived terminal & channel names
+        self.__build_input_terminal()
+        self.__build_output_terminal()
             
     @property
     def input_PFI(self):
@@ -98,8 +143,9 @@ class PulseTrainGenerator:
     @input_PFI.setter
     def input_PFI(self, val):
         if val is not None:
-            self.validate_attribute('input_PFI', val, dtype=int)
+            self.validate_int('input_PFI', val)
         self._input_PFI = val
+        self.__build_input_terminal()
         self.__update_trigger_props('input_PFI')
     
     @property
@@ -109,8 +155,9 @@ class PulseTrainGenerator:
     @output_PFI.setter
     def output_PFI(self, val):
         if val is not None:
-            self.validate_attribute('output_PFI', val, dtype=int)
+            self.validate_int('output_PFI', val)
         self._output_PFI = val
+        self.__build_output_terminal()
         self.__update_trigger_props('output_PFI')
     
     @property
@@ -129,8 +176,7 @@ class PulseTrainGenerator:
     
     @freq.setter
     def freq(self, val):
-        self.validate_attribute('freq', val)
-        self._freq = val
+        self._freq = self.validate_float('freq', val)
         self.__update_timer_props('freq')
     
     @property
@@ -139,8 +185,7 @@ class PulseTrainGenerator:
     
     @duty_cycle.setter
     def duty_cycle(self, val):
-        self.validate_attribute('duty_cycle', val)
-        self._duty_cycle = val
+        self._duty_cycle = self.validate_float('duty_cycle', val)
         self.__update_timer_props('duty_cycle')
     
     @property
@@ -149,8 +194,7 @@ class PulseTrainGenerator:
     
     @initial_delay.setter
     def initial_delay(self, val):
-        self.validate_attribute('initial_delay', val)
-        self._initial_delay = val
+        self._initial_delay = self.validate_float('initial_delay', val)
         self.__update_timer_props('initial_delay')
     
     @property
@@ -159,27 +203,36 @@ class PulseTrainGenerator:
     
     @npulses.setter
     def npulses(self, val):
-        self.validate_attribute('npulses', val, dtype=int)
-        self._npulses = val
+        self._npulses = self.validate_int('npulses', val)
         self.__update_timer_props('npulses')
 
     ######################### DERIVED PROPERTIES #########################
+    # (built once whenever the underlying device name or PFI slot is set)
+
+    def __build_input_terminal(self):
+        if self._input_PFI is None:
+            self._input_terminal = get_nidaq_terminals(self._device_name)[0]
+        else:
+            self._input_terminal = f'/{self._device_name}/PFI{self._input_PFI}'
+
+    def __build_output_terminal(self):
+        if self._output_PFI is None:
+            self._output_terminal = get_nidaq_terminals(self._device_name)[1]
+        else:
+            self._output_terminal = f'/{self._device_name}/PFI{self._output_PFI}'
+        self._output_channel = f'{self._device_name}/ctr{self._output_PFI}'
 
     @property   
     def input_terminal(self):
-        if self.input_PFI is None:
-            return get_nidaq_terminals(self.device_name)[0]
-        return f'/{self.device_name}/PFI{self.input_PFI}'
+        return self._input_terminal
 
     @property   
     def output_terminal(self):
-        if self.output_PFI is None:
-            return get_nidaq_terminals(self.device_name)[1]
-        return f'/{self.device_name}/PFI{self.output_PFI}'
+        return self._output_terminal
 
     @property
     def output_channel(self):
-        return f'{self.device_name}/ctr{self.output_PFI}'
+        return self._output_channel
     
     ######################### OTHER METHODS #########################
 
@@ -192,51 +245,131 @@ class PulseTrainGenerator:
             freq=self.freq,
             duty_cycle=self.duty_cycle,
         )
+        # Property values last written to the underlying task (including those
+        # already set upon channel creation)
+        self._written = {
+            'freq': self.freq,
+            'duty_cycle': self.duty_cycle,
+            'initial_delay': self.initial_delay,
+        }
         self.__update_timer_props('init')
         self.__update_trigger_props('init')
+        # Verify and commit all properties at once
+        self._task.control(TaskMode.TASK_COMMIT)
+    
+    @contextmanager
+    def batch_updates(self):
+        '''
+        Context manager deferring the propagation of property updates to the underlying
+        task until exit, where all properties are propagated and committed at once.
+        Reentrant: nested batches are merged into the outermost one, and properties
+        are only propagated upon clean exit of the outermost batch. If the batch
+        raises an exception, properties are restored to their values prior to it.
+        '''
+        outermost = not self._defer_updates
+        if outermost:
+            prev = {k: getattr(self, k) for k in self._BATCH_ATTRS}
+        self._defer_updates = True
+        try:
+            yield self
+        except BaseException:
+            if outermost:
+                for k, v in prev.items():
+                    setattr(self, k, v)
+            raise
+        finally:
+            self._defer_updates = not outermost
+        if outermost and self._task is not None:
+            self.__update_timer_props('batch')
+            self.__update_trigger_props('batch')
+            self._task.control(TaskMode.TASK_COMMIT)
         
+    def check_task_created(self):
+        ''' Throw error if underlying task has not been created yet '''
+        if self._task is None:
+            raise RuntimeError(
+                f'{self.task_name} task has not been created yet (call create_task first)')
+
     def check_task_disabled(self, propName):
         ''' Throw error if task is already enabled while trying to set a property '''
         assert self._task.is_task_done(), f'Cannot update property "{propName}" while pulse train generator is enabled'
 
     def __update_timer_props(self, propName):
         ''' Propagate timing properties to underlying task & channel '''
-        # If underlying task exists
-        if hasattr(self, '_task'):
-            # Check that task is disabled
-            self.check_task_disabled(propName)
-            # Set Task channel pulse properties: frequency, duty cycle,
-            # delay, and number of pulses
-            self._task.co_channels[0].co_pulse_freq = self.freq
-            self._task.co_channels[0].co_pulse_duty_cyc = self.duty_cycle
-            self._task.co_channels[0].co_pulse_freq_initial_delay = self.initial_delay
-            self._task.timing.cfg_implicit_timing(samps_per_chan= self.npulses)
-            # Ensure that initial delay is conserved upon re-triggering
-            self._task.co_channels[0].co_enable_initial_delay_on_retrigger = True
+        # Skip if underlying task does not exist yet or updates are deferred
+        if self._task is None or self._defer_updates:
+            return
+        # Check that task is disabled
+        self.check_task_disabled(propName)
+        # Set Task channel pulse properties: frequency, duty cycle,
+        # delay, and number of pulses (skipping values already written)
+        chan = self._task.co_channels[0]
+        if self._written.get('freq') != self.freq:
+            chan.co_pulse_freq = self.freq
+            self._written['freq'] = self.freq
+        if self._written.get('duty_cycle') != self.duty_cycle:
+            chan.co_pulse_duty_cyc = self.duty_cycle
+            self._written['duty_cycle'] = self.duty_cycle
+        if self._written.get('initial_delay') != self.initial_delay:
+            chan.co_pulse_freq_initial_delay = self.initial_delay
+            self._written['initial_delay'] = self.initial_delay
+        if self._written.get('npulses') != self.npulses:
+            self._task.timing.cfg_implicit_timing(samps_per_chan=self.npulses)
+            self._written['npulses'] = self.npulses
+        # Ensure that initial delay is conserved upon re-triggering
+        if 'retrigger_delay' not in self._written:
+            chan.co_enable_initial_delay_on_retrigger = True
+            self._written['retrigger_delay'] = True
         
     def __update_trigger_props(self, propName):
         ''' Propagate trigger properties to underlying task '''
-        # If underlying task exists
-        if hasattr(self, '_task'):
-            # Check that task is disabled
-            self.check_task_disabled(propName)
-            # Set the task to start upon acquisition start
-            self._task.triggers.start_trigger.cfg_dig_edge_start_trig(self.input_terminal)
-            # Set task to be triggerable
+        # Skip if underlying task does not exist yet or updates are deferred
+        if self._task is None or self._defer_updates:
+            return
+        # Check that task is disabled
+        self.check_task_disabled(propName)
+        # Set the task to start upon acquisition start
+        input_terminal = self.input_terminal
+        if self._written.get('input_terminal') != input_terminal:
+            self._task.triggers.start_trigger.cfg_dig_edge_start_trig(input_terminal)
+            self._written['input_terminal'] = input_terminal
+        # Set task to be triggerable
+        if 'retriggerable' not in self._written:
             self._task.triggers.start_trigger.retriggerable = True
-            # Set pulse output terminal
-            self._task.co_channels[0].co_pulse_term = self.output_terminal
+            self._written['retriggerable'] = True
+        # Set pulse output terminal
+        output_terminal = self.output_terminal
+        if self._written.get('output_terminal') != output_terminal:
+            self._task.co_channels[0].co_pulse_term = output_terminal
+            self._written['output_terminal'] = output_terminal
     
     def enable(self):
+        self.check_task_created()
         assert self._task.is_task_done(), 'Pulse train generator is already enabled'
         logger.info(f'starting {self.task_name} task...')
         self._task.start()
         
     def disable(self):
+        self.check_task_created()
         logger.info(f'stopping {self.task_name} task...')
         self._task.stop()
 
 
+def create_tasks(ptgs):
+    '''
+    Create the underlying tasks of several pulse train generators concurrently,
+    rather than one after the other
+
+    :param ptgs: list of PulseTrainGenerator objects created with defer_task=True
+    '''
+    if len(ptgs) == 0:
+        return
+    with ThreadPoolExecutor(max_workers=len(ptgs)) as executor:
+        # Consume results to propagate any exception raised in worker threads
+        for _ in executor.map(lambda ptg: ptg.create_task(), ptgs):
+            pass
+
+
 def get_trigger_pulses(name, delay=0, interval=1., npulses=1, PFI=1):
     '''
     Set up a train of TTL pulse(s) to be triggered upon acquisition 
@@ -261,4 +394,21 @@ def get_trigger_pulses(name, delay=0, interval=1., npulses=1, PFI=1):
     # Start underlying task
     ptg.enable()
     # Enable
-    return ptg
\ No newline at end of file
+    return ptg
+
+def get_trigger_pulses_async(*args, executor=None, **kwargs):
+    '''
+    Non-blocking variant of get_trigger_pulses, allowing to overlap the pulse train
+    setup with the initialization of other instruments (the returned future can
+    also be awaited within an asyncio event loop via asyncio.wrap_future)
+    
+    :param executor: executor on which to run the setup (if None, a single-use
+        worker thread is created)
+    :return: future resolving to the enabled PulseTrainGenerator object
+    '''
+    if executor is not None:
+        return executor.submit(get_trigger_pulses, *args, **kwargs)
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(get_trigger_pulses, *args, **kwargs)
+    executor.shutdown(wait=False)
+    return future
@@ -6,8 +6,12 @@
 # @Last Modified time: 2022-04-08 21:17:22
 
 import abc
-import re
+import math
+import os
 import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from PIL import Image
 import matplotlib.pyplot as plt
 
@@ -18,6 +22,22 @@ from .visa_instrument import *
 
 class Oscilloscope(VisaInstrument):
     ''' Base class for oscilloscopes. '''
+
+    # Whether waveforms from different channels can be fetched concurrently
+    # (i.e. if per-channel waveform queries do not rely on shared instrument state)
+    CONCURRENT_WAVEFORM_FETCH = False
+
+    SAST_PREFIX = 'SAST '  # acquisition status reply prefix
+    ESR_OPC = 1  # operation complete bit of the standard event status register
+
+    # Image file extensions per magic bytes signature
+    IMAGE_SIGNATURES = {
+        b'\x89PNG': 'png',
+        b'BM': 'bmp',
+        b'II*\x00': 'tif',
+        b'MM\x00*': 'tif',
+        b'\xff\xd8': 'jpg',
+    }
     
     # --------------------- REQUIRED ATTRIBUTES ---------------------
     
@@ -134,14 +154,21 @@ class Oscilloscope(VisaInstrument):
         raise NotImplementedError
     
     def restrict_traces(self, ichs):
-        ''' Restrict trace display to specific channels '''
-        # Show traces for speficied channels
+        '''
+        Restrict trace display to specific channels (in a single compound message,
+        if supported by the instrument)
+        '''
+        ichs = frozenset(ichs)
         for ich in ichs:
-            self.show_trace(ich)
-        # Hide traces for all other channels
-        for ich in list(set(self.CHANNELS) - set(ichs)):
-            if self.is_trace(ich):
-                self.hide_trace(ich)
+            self.check_channel_index(ich)
+        with self.batch_writes():
+            # Show traces for specified channels, and hide traces for all other
+            # channels (idempotent, no need to query state)
+            for ich in self.CHANNELS:
+                if ich in ichs:
+                    self.show_trace(ich)
+                else:
+                    self.hide_trace(ich)
     
     @abc.abstractmethod
     def get_screen_binary_img(self):
@@ -156,9 +183,36 @@ class Oscilloscope(VisaInstrument):
         '''
         # Extract binary image
         binary_img = self.get_screen_binary_img()
-        # Convert image to PIL readable object and return
+        # Convert image to PIL readable object and return (BytesIO wraps the
+        # bytes object without copying it, and PIL decodes it lazily)
         return Image.open(io.BytesIO(binary_img))
 
+    def get_image_format(self, binary_img):
+        ''' Detect the file format of a binary image from its magic bytes '''
+        for signature, ext in self.IMAGE_SIGNATURES.items():
+            if binary_img.startswith(signature):
+                return ext
+        raise VisaError('unknown screen capture image format')
+
+    def save_screen_capture(self, fpath):
+        '''
+        Capture screen and save it directly to file, without decoding the image
+        
+        :param fpath: output file path (if it has no extension, one is added based
+            on the detected image format)
+        :return: path to the saved image file
+        '''
+        # Extract binary image
+        binary_img = self.get_screen_binary_img()
+        # Add file extension if needed
+        if not os.path.splitext(fpath)[1]:
+            fpath = f'{fpath}.{self.get_image_format(binary_img)}'
+        # Write raw bytes to file and return file path
+        with open(fpath, 'wb') as f:
+            f.write(binary_img)
+        self.log(f'saved screen capture to "{fpath}"')
+        return fpath
+
     # --------------------- SCALES / OFFSETS ---------------------
 
     @abc.abstractmethod
@@ -176,10 +230,35 @@ class Oscilloscope(VisaInstrument):
         ''' Get the temporal scale (in s/div) '''
         raise NotImplementedError
     
+    def get_closest_temporal_scale(self, value):
+        '''
+        Get the valid temporal scale closest to a target value (in log-distance)
+
+        :param value: target temporal scale (in s/div)
+        :return: closest valid temporal scale (in s/div)
+        '''
+        if value <= 0:
+            raise VisaError(f'invalid temporal scale: {value} s/div (must be strictly positive)')
+        lv = math.log(value)
+        i = int(np.searchsorted(self.LOG_TDIVS, lv))
+        if i == self.LOG_TDIVS.size:
+            i -= 1
+        elif i > 0 and lv - self.LOG_TDIVS[i - 1] < self.LOG_TDIVS[i] - lv:
+            i -= 1
+        return self.TDIVS[i]
+
     def get_temporal_range(self):
         ''' Get temporal display range at current temporal scale range (in s) '''
         return self.get_temporal_scale() * self.NHDIVS
     
+    def check_vertical_scale(self, value):
+        ''' Check that vertical scale value does not exceed instrument limit '''
+        if value > self.MAX_VDIV:
+            logger.warning(
+                f'target vertical scale ({value} V/div) above instrument limit ({self.MAX_VDIV} V/div) -> restricting')
+            value = self.MAX_VDIV
+        return value
+
     @abc.abstractmethod
     def set_vertical_scale(self, ich, value):
         ''' Set the vertical sensitivity of the specified channel (in V/div) '''
@@ -309,14 +388,40 @@ class Oscilloscope(VisaInstrument):
         ''' Set trigger level (in V) '''
         raise NotImplementedError
 
-    def check_trigger_delay(self, value):
-        ''' Check that trigger delay value falls within current temporal range '''
-        thalfrange = self.get_temporal_range() / 2
-        if np.abs(value) > thalfrange:
+    def check_trigger_delay(self, value, tdiv=None):
+        '''
+        Check that trigger delay value falls within temporal range
+
+        :param value: trigger delay (s)
+        :param tdiv (optional): temporal scale (s/div) against which to check the delay.
+            If not provided, the current temporal scale is queried from the instrument.
+        :return: trigger delay restricted to the temporal range (s)
+        '''
+        if tdiv is None:
+            thalfrange = self.get_temporal_range() / 2
+        else:
+            thalfrange = tdiv * self.NHDIVS / 2
+        if abs(value) > thalfrange:
             logger.warning(
                 f'target temporal delay ({si_format(value, 2)}s) outside of current display temporal bounds (+/- {si_format(thalfrange, 2)}s) -> restricting')
-            value = np.sign(value) * thalfrange
+            value = math.copysign(thalfrange, value)
         return value
+
+    def check_trigger_delays(self, values):
+        '''
+        Vectorized variant of check_trigger_delay, querying the temporal range only
+        once for an entire sweep of trigger delays
+        
+        :param values: array of trigger delays (s)
+        :return: array of trigger delays restricted to the current temporal range (s)
+        '''
+        thalfrange = self.get_temporal_range() / 2
+        values = np.asarray(values, dtype=np.float64)
+        noutside = np.count_nonzero(np.abs(values) > thalfrange)
+        if noutside > 0:
+            logger.warning(
+                f'{noutside} target temporal delays outside of current display temporal bounds (+/- {si_format(thalfrange, 2)}s) -> restricting')
+        return np.clip(values, -thalfrange, thalfrange)
     
     @abc.abstractmethod
     def get_trigger_delay(self):
@@ -348,6 +453,59 @@ class Oscilloscope(VisaInstrument):
         '''
         raise NotImplementedError
     
+    def arm_acquisition_sync(self):
+        '''
+        Arm acquisition and block until the instrument reports the operation complete
+        
+        :return: operation completion status
+        '''
+        self.arm_acquisition()
+        return self.is_operation_complete()
+
+    def arm_acquisition_polled(self, timeout=10., poll_interval=.01, cancel_event=None):
+        '''
+        Arm acquisition and poll the standard event status register until the instrument
+        reports the operation complete (via *OPC). Unlike arm_acquisition_sync, the VISA
+        session is only held during individual polls, and waiting can be cancelled.
+        
+        :param timeout: maximum waiting time (s)
+        :param poll_interval: time interval between successive polls (s)
+        :param cancel_event: threading.Event aborting the wait when set (optional)
+        :return: operation completion status (False if the wait was cancelled)
+        '''
+        with self.thread_locking():
+            self.arm_acquisition()
+            self.write('*OPC')
+            tstop = time.monotonic() + timeout
+            while not self.get_event_status_register() & self.ESR_OPC:
+                if time.monotonic() >= tstop:
+                    raise VisaError(f'acquisition not completed within {timeout} s')
+                if cancel_event is None:
+                    time.sleep(poll_interval)
+                elif cancel_event.wait(poll_interval):
+                    return False
+        return True
+
+    def arm_acquisition_async(self, executor=None, **kwargs):
+        '''
+        Non-blocking variant of arm_acquisition_polled, allowing to overlap the
+        acquisition arming with the configuration of other instruments (e.g. waveform
+        generator). The oscilloscope may be accessed by other threads in between polls,
+        as long as their I/O operations are locked (i.e. with the lock flag enabled).
+        
+        :param executor: executor on which to run the arming (if None, a single-use
+            worker thread is created)
+        :param kwargs: keyword arguments passed to arm_acquisition_polled (e.g. timeout,
+            or cancel_event to abort the wait)
+        :return: future resolving to the operation completion status
+        '''
+        if executor is not None:
+            return executor.submit(self.arm_acquisition_polled, **kwargs)
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(self.arm_acquisition_polled, **kwargs)
+        executor.shutdown(wait=False)
+        return future
+
     def stop_acquisition(self):
         '''
         Immediately stops the acquisition of a signal (if the trigger mode is
@@ -368,8 +526,9 @@ class Oscilloscope(VisaInstrument):
     def get_acquisition_status(self):
         ''' Get the acquisition status of the oscilloscope '''
         out = self.query('SAST?')
-        mo = re.match('SAST (.+)', out)
-        return mo[1]
+        if not out.startswith(self.SAST_PREFIX) or len(out) == len(self.SAST_PREFIX):
+            raise VisaError(f'could not extract acquisition status from "{out}"')
+        return out[len(self.SAST_PREFIX):]
     
     @abc.abstractmethod
     def get_sample_rate(self):
@@ -425,6 +584,89 @@ class Oscilloscope(VisaInstrument):
             - y: waveform signal (V)
         '''
         raise NotImplementedError
+
+    @abc.abstractmethod
+    def fetch_waveform(self, ich):
+        '''
+        Fetch raw waveform samples and linear scaling parameters from a specific channel
+        
+        :param ich: channel index
+        :return: 5-tuple with:
+            - y: raw waveform samples (ADC codes), such that signal (V) = y * vgain - voff
+            - vgain: vertical gain (V/sample unit)
+            - voff: vertical offset (V)
+            - dt: sampling interval (s)
+            - hoff: horizontal offset (s)
+        '''
+        raise NotImplementedError
+
+    def map_channels(self, func, ichs, **kwargs):
+        '''
+        Apply a channel-specific fetch function to multiple channels. If supported by the
+        instrument, calls are dispatched to a pool of worker threads, such that data
+        parsing of one channel overlaps with data transfer of the others.
+        
+        :param func: function taking a channel index as first argument
+        :param ichs: list of channel indexes
+        :return: dictionary of (channel index: output) pairs
+        '''
+        # Call function sequentially if concurrent fetch is not supported
+        if not self.CONCURRENT_WAVEFORM_FETCH or len(ichs) < 2:
+            return {ich: func(ich, **kwargs) for ich in ichs}
+        
+        # Otherwise, call function in parallel, with locked I/O in worker threads to
+        # ensure that each query/response exchange remains atomic
+        def fetch(ich):
+            with self.thread_locking():
+                return func(ich, **kwargs)
+
+        with ThreadPoolExecutor(max_workers=len(ichs)) as executor:
+            futures = {ich: executor.submit(fetch, ich) for ich in ichs}
+            return {ich: f.result() for ich, f in futures.items()}
+
+    def get_waveforms(self, ichs, **kwargs):
+        '''
+        Get waveform data from multiple channels (concurrently, if supported)
+        
+        :param ichs: list of channel indexes
+        :return: dictionary of (channel index: (t, y)) pairs
+        '''
+        return self.map_channels(self.get_waveform_data, ichs, **kwargs)
+
+    def acquire_block(self, ichs, dtype=np.float32, **kwargs):
+        '''
+        Get waveform data from multiple channels as a single contiguous 2D array
+        
+        :param ichs: list of channel indexes
+        :param dtype: floating point type of the output waveform signals
+        :return: 2-tuple with:
+            - t: time signal (s), shared across channels
+            - Y: (nsamples x nchannels) waveform signals array (V), with one column per channel
+        '''
+        if len(ichs) == 0:
+            raise VisaError('at least one channel index must be provided')
+        
+        # Fetch raw waveforms, and check that they share the same time vector
+        raws = self.map_channels(self.fetch_waveform, ichs, **kwargs)
+        y0, _, _, dt, hoff = raws[ichs[0]]
+        for ich in ichs[1:]:
+            y, _, _, dtich, hoffich = raws[ich]
+            if y.size != y0.size or dtich != dt or hoffich != hoff:
+                raise VisaError(
+                    f'channel {ich} time vector does not match that of channel {ichs[0]}')
+        
+        # Rescale raw waveforms directly into the columns of a single preallocated array
+        Y = np.empty((y0.size, len(ichs)), dtype=dtype, order='F')
+        for i, ich in enumerate(ichs):
+            y, vgain, voff, _, _ = raws.pop(ich)
+            np.multiply(y, vgain, out=Y[:, i], dtype=dtype)
+            np.subtract(Y[:, i], voff, out=Y[:, i])  # V
+        
+        # Get shared time vector, scaled and shifted in place
+        t = np.arange(y0.size, dtype=np.float64)
+        t *= dt
+        t += hoff  # s
+        return t, Y
     
     # --------------------- PLOTTING ---------------------
     
@@ -443,7 +685,8 @@ class Oscilloscope(VisaInstrument):
         ax.set_title('waveform data')
         for i in range(n):
             t, y = self.get_waveform_data(*args, **kwargs)
-            ax.plot(t * 1e3, y, label=f'acq{i + 1}')
+            t *= S_TO_MS  # time vector is freshly allocated -> rescale in place
+            ax.plot(t, y, label=f'acq{i + 1}')
         ax.axvline(0, c='k', ls='--')
         ax.axhline(0, c='k', ls='--')
         if n > 1:
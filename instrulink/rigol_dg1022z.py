@@ -29,11 +29,18 @@ class RigolDG1022Z(WaveformGenerator):
     VMAX = 20.0  # max voltage (Vpp)
     ANTIPHASE = 180  # degrees
     CHANNELS = (1, 2)
+    FREQ_COMMANDS = {c: f'SOUR{c}:FREQ:FIX %s' for c in CHANNELS}  # frequency command templates
+    AMPL_COMMANDS = {c: f'SOUR{c}:VOLT:LEV:IMM:AMPL %s' for c in CHANNELS}  # amplitude command templates
+    OFFS_COMMANDS = {c: f'SOUR{c}:VOLT:LEV:IMM:OFFS %s' for c in CHANNELS}  # offset command templates
     PREFIX = ':'
+    FREQ_NEUTRAL_PATTERN = re.compile(  # commands leaving carrier frequencies unchanged
+        r'(OUTP\d|SOUR\d:(BURS|VOLT|AM|MOD|PHAS|PULS:HOLD|FUNC:(PULS|SQU):(WIDT|DCYC))'
+        r'|COUP:(AMPL|PHAS)|SYST:BEEP|\*WAI)')
+    BATCH_SCPI = True  # root-prefixed commands can be chained in compound messages
     # TIMEOUT_SECONDS = 20.  # long timeout to allow slow commands (e.g. waveform loading)
 
     # Coupling
-    CPL_PATTERN = '^FREQ:(ON|OFF),PHASE:(ON|OFF),AMPL:(ON|OFF)$'
+    CPL_PATTERN = re.compile('^FREQ:(ON|OFF),PHASE:(ON|OFF),AMPL:(ON|OFF)$')
     CPL_MODES = ('OFFS', 'RAT')  # coupling modes
     CPL_AMP_RATIO_BOUNDS = (1e-3, 1e3)  # bounds for amplitude coupling ratio
     CPL_AMP_DEV_BOUNDS = (-19.998, 19.998)  # bounds for amplitude coupling deviation
@@ -45,7 +52,9 @@ class RigolDG1022Z(WaveformGenerator):
     # Bursting
     BURST_MODES = ('TRIG', 'INF', 'GAT')
     BURST_IDLE_LEVELS = ('FPT', 'TOP', 'CENTER', 'BOTTOM')
+    BURST_IDLE_LEVEL_SET = frozenset(BURST_IDLE_LEVELS)  # same, for constant-time validation
     PULSE_HOLDS = ('WIDT', 'DUTY')
+    PULSE_HOLD_SET = frozenset(PULSE_HOLDS)  # same, for constant-time validation
     MAX_BURST_PERIOD = 500. # s
 
     # Modulation
@@ -66,7 +75,7 @@ class RigolDG1022Z(WaveformGenerator):
     ARB_WF_MAXNPTS_PER_PACKET = 8192  # max number of points per packet for arbitrary waveform upload
     ARB_WF_DAC_RANGE = (0, 16383)  # integer range for arbitrary waveform DAC values
     ARB_WF_FLOAT_RANGE = (-1, 1)  # floating point range for arbitrary waveform values
-    WAF_PATTERN = '^(ARB)(10?|[2-9])$'
+    WAF_PATTERN = re.compile('^(ARB)(10?|[2-9])$')
 
     def beep(self):
         ''' Issue a single beep immediately. '''
@@ -102,22 +111,21 @@ class RigolDG1022Z(WaveformGenerator):
         self.write(f'OUTP{ich} OFF')   
 
     def enable_output(self):
-        for ich in self.CHANNELS:
-            self.enable_output_channel(ich)
+        ''' Turn all channel outputs ON '''
+        self.write_many([f'OUTP{ich} ON' for ich in self.CHANNELS])
 
     def disable_output(self):
-        for ich in self.CHANNELS:
-            self.disable_output_channel(ich)
+        ''' Turn all channel outputs OFF '''
+        self.write_many([f'OUTP{ich} OFF' for ich in self.CHANNELS])
     
     def get_output_state(self, *ich):
         ''' Get the output state for a specific channel '''
         if len(ich) == 0:
             ich = self.CHANNELS
-        if len(ich) > 1:
-            return [self.get_output_state(x) for x in ich]
-        ich = ich[0]
-        self.check_channel_index(ich)
-        return self.query(f'OUTP{ich}?')
+        for x in ich:
+            self.check_channel_index(x)
+        out = self.query_many([f'OUTP{x}?' for x in ich])
+        return out if len(ich) > 1 else out[0]
 
     def test_output(self):
         ''' Test output enabling/disabling sequence '''
@@ -217,7 +225,7 @@ class RigolDG1022Z(WaveformGenerator):
         :return: dictionary of coupling states
         '''
         out = self.query('COUP?')
-        mo = re.match(self.CPL_PATTERN, out)
+        mo = self.CPL_PATTERN.match(out)
         if mo is None:
             raise VisaError(f'invalid coupling query response: "{out}"')
         cplstates = dict(zip(('FREQ', 'PHASE', 'AMPL'), mo.groups()))
@@ -462,6 +470,8 @@ class RigolDG1022Z(WaveformGenerator):
         self.check_channel_index(ich)
         self.check_waveform_type(wtype)
         self.write(f'SOUR{ich}:APPL:{wtype} {freq}, {amp}, {offset}, {phase}')
+        if isinstance(freq, (int, float)):
+            self.cache_reply(f'SOUR{ich}:FREQ:FIX?', float(freq))
     
     def apply_arbitrary(self, ich, sr):
         ''' 
@@ -490,16 +500,28 @@ class RigolDG1022Z(WaveformGenerator):
     def set_waveform_freq(self, ich, freq):
         self.check_channel_index(ich)
         self.check_freq(freq)
-        self.write(f'SOUR{ich}:FREQ:FIX {freq}')
+        self.write(self.FREQ_COMMANDS[ich] % freq)
+        if isinstance(freq, (int, float)):
+            self.cache_reply(f'SOUR{ich}:FREQ:FIX?', float(freq))
 
     def get_waveform_freq(self, ich):
         self.check_channel_index(ich)
-        return float(self.query(f'SOUR{ich}:FREQ:FIX?'))
+        return self.cached_query(f'SOUR{ich}:FREQ:FIX?', float)
+
+    def affects_cached_reply(self, cmd, query):
+        '''
+        Whether a written command may alter a cached query response. Carrier frequencies
+        are only preserved by commands of unrelated subsystems (on any channel, since
+        frequencies may be coupled across channels).
+        '''
+        if query.endswith(':FREQ:FIX?'):
+            return self.FREQ_NEUTRAL_PATTERN.match(cmd) is None
+        return True
     
     def set_waveform_amp(self, ich, amp):
         self.check_channel_index(ich)
         self.check_amp(amp)
-        self.write(f'SOUR{ich}:VOLT:LEV:IMM:AMPL {amp}')
+        self.write(self.AMPL_COMMANDS[ich] % amp)
 
     def get_waveform_amp(self, ich):
         self.check_channel_index(ich)
@@ -512,7 +534,7 @@ class RigolDG1022Z(WaveformGenerator):
     def set_waveform_offset(self, ich, offset):
         self.check_channel_index(ich)
         self.check_offset(offset, ich)
-        self.write(f'SOUR{ich}:VOLT:LEV:IMM:OFFS {offset}')
+        self.write(self.OFFS_COMMANDS[ich] % offset)
 
     def get_waveform_offset(self, ich):
         self.check_channel_index(ich)
@@ -548,7 +570,7 @@ class RigolDG1022Z(WaveformGenerator):
         ''' 
         Set the pulse mode highlight item of the specified channel
         '''
-        if phold not in self.PULSE_HOLDS:
+        if phold not in self.PULSE_HOLD_SET:
             raise VisaError(
                 f'{phold} not a valid pulse hold mode. Candidates are {self.PULSE_HOLDS}')
         self.write(f'SOUR{ich}:PULS:HOLD {phold}')
@@ -692,7 +714,9 @@ class RigolDG1022Z(WaveformGenerator):
     
     def write_binary_values(self, cmd, values, **kwargs):
         ''' Write binary values to instrument. '''
-        logger.debug(f'{cmd} {values.size}')
+        self.invalidate_cache()
+        self.flush_writes()
+        logger.debug('%s %s', cmd, values.size)
         self.instrument_handle.write_binary_values(
             f'{self.PREFIX}{cmd}', values, **kwargs)
 
@@ -738,26 +762,29 @@ class RigolDG1022Z(WaveformGenerator):
             lb, ub = self.ARB_WF_FLOAT_RANGE
         y = self.normalize(y, lb=lb, ub=ub)
 
-        # Convert to integer if necessary
-        if dtype in ('dac', 'dac16'):
+        # Convert to integer if necessary (16-bit little-endian words for binary upload,
+        # matching the wire format so that no conversion occurs during transfer)
+        if dtype == 'dac16':
+            y = y.astype('<u2')
+        elif dtype == 'dac':
             y = y.astype(int)
 
         # If binary upload
         if dtype == 'dac16':
             # Upload waveform to volatile memory, by successive packets
             nperpacket = self.ARB_WF_MAXNPTS_PER_PACKET
-            yremain = y.copy()
-            while yremain.size > 0:
-                ypacket, yremain = yremain[:nperpacket], yremain[nperpacket:]
-                suffix = 'CON' if yremain.size > 0 else 'END'
+            for istart in range(0, y.size, nperpacket):
+                ypacket = y[istart:istart + nperpacket]  # view, no copy
+                suffix = 'CON' if istart + nperpacket < y.size else 'END'
                 self.write_binary_values(
                     f'SOUR{ich}:TRAC:DATA:DAC16 VOLATILE,{suffix},',
                     ypacket, datatype='H', is_big_endian=False)
         
         # If string upload
         else:
-            # Transform waveform vector to string
-            ystr = ','.join([f'{yy:.{precision}f}' for yy in y])
+            # Transform waveform vector to string (formatting all samples in a single
+            # vectorized call rather than a Python-level loop)
+            ystr = ','.join(np.char.mod(f'%.{precision}f', y).tolist())
 
             # Upload waveform to volatile memory
             cmdprefix = f'SOUR{ich}:DATA'
@@ -879,9 +906,9 @@ class RigolDG1022Z(WaveformGenerator):
     
     def check_waveform_file_name(self, name):
         ''' Check that a waveform file name is valid. '''
-        mo = re.match(self.WAF_PATTERN, name)
+        mo = self.WAF_PATTERN.match(name)
         if mo is None:
-            raise VisaError(f'invalid waveform file name: "{name}" (must match {self.WAF_PATTERN})')
+            raise VisaError(f'invalid waveform file name: "{name}" (must match {self.WAF_PATTERN.pattern})')
     
     def save_waveform_to_memory(self, name):
         '''
@@ -972,7 +999,7 @@ class RigolDG1022Z(WaveformGenerator):
     def set_burst_idle_level(self, ich, lvl):
         ''' Set the idle level position of the burst mode for the specified channel '''
         self.check_channel_index(ich)
-        if lvl not in self.BURST_IDLE_LEVELS:
+        if lvl not in self.BURST_IDLE_LEVEL_SET:
             raise VisaError(
                 f'{lvl} is not a valid idle level (options are {self.BURST_IDLE_LEVELS})')
         self.write(f'SOUR{ich}:BURS:IDLE {lvl}')
@@ -1206,8 +1233,8 @@ class RigolDG1022Z(WaveformGenerator):
         ''' Trigger specific channel programmatically. '''
         self.check_channel_index(ich)
         self.log(f'triggering channel {ich} programmatically')
-        self.write(f'SOUR{ich}:BURS:TRIG:IMM')
-        self.wait()
+        # Trigger and wait for completion in a single compound message
+        self.write_many([f'SOUR{ich}:BURS:TRIG:IMM', '*WAI'])
 
     def start_trigger_loop(self, ich, T=None):
         '''
@@ -1257,25 +1284,28 @@ class RigolDG1022Z(WaveformGenerator):
         # Log process
         self.log(s)
         
-        # Apply pulse with specific frequency, amplitude and offset
-        self.apply_pulse(ich, PRF, Vpp, offset=Vpp / 2.)
-        # Set nominal pulse width
-        self.set_pulse_width(ich, TTL_PWIDTH)
-        # Set pulse idle level to "bottom"
-        self.set_burst_idle_level(ich, 'BOTTOM')
-        # Set channel trigger source to external (to avoid erroneous outputs upon setting)
-        self.set_trigger_source(ich, 'EXT')
-        # Set burst repetition period, if any
-        if T is not None:
-            self.set_burst_internal_period(ich, T)  # s
-        # Set burst duration
-        self.set_burst_duration(ich, tburst)  # s
-        # Enable burst mode on channel
-        self.enable_burst(ich)
-        # Enable channel sync signal on rear panel connector
-        self.enable_output_sync(ich)
-        # Set channel trigger source
-        self.set_trigger_source(ich, trig_source)
+        # Send setup commands as a single compound message
+        with self.batch_writes():
+            # Apply pulse with specific frequency, amplitude and offset
+            self.apply_pulse(ich, PRF, Vpp, offset=Vpp / 2.)
+            # Set nominal pulse width
+            self.set_pulse_width(ich, TTL_PWIDTH)
+            # Set pulse idle level to "bottom"
+            self.set_burst_idle_level(ich, 'BOTTOM')
+            # Set channel trigger source to external (to avoid erroneous outputs upon setting)
+            self.set_trigger_source(ich, 'EXT')
+            # Set burst repetition period, if any
+            if T is not None:
+                self.set_burst_internal_period(ich, T)  # s
+            # Set burst duration
+            self.set_burst_duration(ich, tburst)  # s
+            # Enable burst mode on channel
+            self.enable_burst(ich)
+            # Enable channel sync signal on rear panel connector
+            self.enable_output_sync(ich)
+            # Set channel trigger source (if different from external source set above)
+            if trig_source != 'EXT':
+                self.set_trigger_source(ich, trig_source)
     
     def set_AM_pulse_train(self, ich, PRF, DC, tburst, tramp=0, T=None, trig_source='EXT'):
         '''
@@ -1311,42 +1341,45 @@ class RigolDG1022Z(WaveformGenerator):
         # Log process
         self.log(s)
 
-        # If ramping time is specified
-        if tramp > 0:
-            # Design smoothed waveform with appropriate number of points
-            npts = self.ARB_WF_MAXNPTS_PER_PACKET
-            _, y = get_DC_smoothed_pulse_envelope(npts, PRF, DC, tramp=tramp, plot=None)
-            # Upload it to volatile memory of specified channel, 
-            # and set waveform type to "user"
-            self.upload_arbitrary_waveform(ich, y, activate=True)
-        # Otherwise
-        else:
-            # Use standard rectangular pulse with specific duty cycle
-            self.set_waveform_type(ich, 'SQU')
-            self.set_square_duty_cycle(ich, DC)  # %
-            self.invert_waveform_phase(ich)  # invert phase to avoid DC offset
-
-        # Set waveform amplitude to full AM range (with extra margin) and ensure zero offset
-        self.set_waveform_amp(ich, (1 + 2 * self.MOD_VOLT_MARGIN) * self.MOD_VOLT_AMP)
-        self.set_waveform_offset(ich, 0)
-        # Apply waveform as burst with specific repetition frequency
-        self.set_waveform_freq(ich, PRF)
-        # Set channel trigger source to external (to avoid erroneous outputs upon setting)
-        self.set_trigger_source(ich, 'EXT')
-        # Set burst repetition period, if any
-        if T is not None:
-            self.set_burst_internal_period(ich, T)  # s
-        # Set burst duration
-        self.set_burst_duration(ich, tburst)  # s
-        # Enable burst mode on channel
-        self.enable_burst(ich)
-        # Enable channel sync signal on rear panel connector
-        self.enable_output_sync(ich)
-        # If waveform is phase-inverted, set sync polarity to negative
-        if self.is_waveform_phase_inverted(ich):
-            self.set_output_sync_polarity(ich, 'NEG')
-        # Set channel trigger source
-        self.set_trigger_source(ich, trig_source)
+        # Send setup commands as few compound messages (split by waveform upload, if any)
+        with self.batch_writes():
+            # If ramping time is specified
+            if tramp > 0:
+                # Design smoothed waveform with appropriate number of points
+                npts = self.ARB_WF_MAXNPTS_PER_PACKET
+                _, y = get_DC_smoothed_pulse_envelope(npts, PRF, DC, tramp=tramp, plot=None)
+                # Upload it to volatile memory of specified channel, 
+                # and set waveform type to "user"
+                self.upload_arbitrary_waveform(ich, y, activate=True)
+            # Otherwise
+            else:
+                # Use standard rectangular pulse with specific duty cycle
+                self.set_waveform_type(ich, 'SQU')
+                self.set_square_duty_cycle(ich, DC)  # %
+                self.invert_waveform_phase(ich)  # invert phase to avoid DC offset
+
+            # Set waveform amplitude to full AM range (with extra margin) and ensure zero offset
+            self.set_waveform_amp(ich, (1 + 2 * self.MOD_VOLT_MARGIN) * self.MOD_VOLT_AMP)
+            self.set_waveform_offset(ich, 0)
+            # Apply waveform as burst with specific repetition frequency
+            self.set_waveform_freq(ich, PRF)
+            # Set channel trigger source to external (to avoid erroneous outputs upon setting)
+            self.set_trigger_source(ich, 'EXT')
+            # Set burst repetition period, if any
+            if T is not None:
+                self.set_burst_internal_period(ich, T)  # s
+            # Set burst duration
+            self.set_burst_duration(ich, tburst)  # s
+            # Enable burst mode on channel
+            self.enable_burst(ich)
+            # Enable channel sync signal on rear panel connector
+            self.enable_output_sync(ich)
+            # If waveform is phase-inverted, set sync polarity to negative
+            if self.is_waveform_phase_inverted(ich):
+                self.set_output_sync_polarity(ich, 'NEG')
+            # Set channel trigger source (if different from external source set above)
+            if trig_source != 'EXT':
+                self.set_trigger_source(ich, trig_source)
 
     def set_triggered_sine_burst_train(self, Fdrive, Vpp, tstim, PRF, DC, ich_trig=1, ich_carrier=2, **kwargs):
         '''
@@ -1369,16 +1402,19 @@ class RigolDG1022Z(WaveformGenerator):
         self.disable_output_channel(ich_carrier)
         self.disable_output_channel(ich_trig)
         
-        # Set trigger channel parameters
-        self.set_trigger_pulse_train(ich_trig, PRF, tstim, **kwargs)
-
-        # Set carrier channel parameters
+        # Set trigger and carrier channel parameters, with commands grouped
+        # into compound messages (flushed before each intermediate query)
         tburst = DC / (100 * PRF)  # s
-        self.log(f'setting channel {ich_carrier} to output {si_format(tburst, 2)}s long, ({si_format(Fdrive, 2)}Hz, {si_format(Vpp, 3)}Vpp) sine wave triggered externally by channel {ich_trig}')
-        self.apply_sine(ich_carrier, Fdrive, Vpp)
-        self.set_burst_duration(ich_carrier, tburst)  # s
-        self.enable_burst(ich_carrier)
-        self.set_trigger_source(ich_carrier, 'EXT')
+        with self.batch_writes():
+            # Set trigger channel parameters
+            self.set_trigger_pulse_train(ich_trig, PRF, tstim, **kwargs)
+
+            # Set carrier channel parameters
+            self.log(f'setting channel {ich_carrier} to output {si_format(tburst, 2)}s long, ({si_format(Fdrive, 2)}Hz, {si_format(Vpp, 3)}Vpp) sine wave triggered externally by channel {ich_trig}')
+            self.apply_sine(ich_carrier, Fdrive, Vpp)
+            self.set_burst_duration(ich_carrier, tburst)  # s
+            self.enable_burst(ich_carrier)
+            self.set_trigger_source(ich_carrier, 'EXT')
 
         # If carrier amplitude is > 0, enable all outputs 
         # (carrier channel last to avoid erroneous outputs)
@@ -1408,14 +1444,17 @@ class RigolDG1022Z(WaveformGenerator):
         self.disable_output_channel(ich_carrier)
         self.disable_output_channel(ich_mod)
         
-        # Set envelope modulating channel parameters
-        self.set_AM_pulse_train(ich_mod, PRF, DC, tstim, tramp=tramp, **kwargs)
-
-        # Set sinewave channel parameters
-        self.log(f'setting channel {ich_carrier} to output ({si_format(Fdrive, 2)}Hz, {si_format(Vpp, 3)}Vpp) sine wave amplitude-modulated externally by channel {ich_mod}')
-        self.apply_sine(ich_carrier, Fdrive, Vpp, 0)
-        self.enable_am(ich_carrier)
-        self.set_am_source(ich_carrier, 'EXT')
+        # Set modulating and carrier channel parameters, with commands grouped
+        # into compound messages (flushed before each intermediate query)
+        with self.batch_writes():
+            # Set envelope modulating channel parameters
+            self.set_AM_pulse_train(ich_mod, PRF, DC, tstim, tramp=tramp, **kwargs)
+
+            # Set sinewave channel parameters
+            self.log(f'setting channel {ich_carrier} to output ({si_format(Fdrive, 2)}Hz, {si_format(Vpp, 3)}Vpp) sine wave amplitude-modulated externally by channel {ich_mod}')
+            self.apply_sine(ich_carrier, Fdrive, Vpp, 0)
+            self.enable_am(ich_carrier)
+            self.set_am_source(ich_carrier, 'EXT')
 
         # If carrier amplitude is > 0, enable all outputs 
         # (carrier channel last to avoid erroneous outputs)
@@ -1533,11 +1572,12 @@ class RigolDG1022Z(WaveformGenerator):
             # Disable all outputs
             self.disable_output_channel(ich)
             
-            # Set sine wave channel parameters
-            self.apply_sine(ich, Fdrive, Vpp)
-            self.set_burst_internal_period(ich, 1 / PRF)  # s
-            self.set_burst_ncycles(ich, ncycles)
-            self.enable_burst(ich)
+            # Set sine wave channel parameters, in a single compound message
+            with self.batch_writes():
+                self.apply_sine(ich, Fdrive, Vpp)
+                self.set_burst_internal_period(ich, 1 / PRF)  # s
+                self.set_burst_ncycles(ich, ncycles)
+                self.enable_burst(ich)
 
             # Start trigger loop and enable output
             self.start_trigger_loop(ich)
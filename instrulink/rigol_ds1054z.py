@@ -5,7 +5,6 @@
 # @Last Modified time: 2024-05-07 15:28:02
 # @Last Modified time: 2022-04-08 21:17:22
 
-import struct
 import numpy as np
 
 from .constants import *
@@ -20,16 +19,19 @@ class RigolDS1054Z(Oscilloscope):
     # General parameters
     USB_ID = 'DS1ZA\d+' # USB identifier
     PREFIX = ':'  # prefix to be added to each command
+    BATCH_SCPI = True  # root-prefixed commands can be chained in compound messages
     TIMEOUT_SECONDS = 20.  # long timeout to allow slow commands (e.g. auto-setup)
+    CHUNK_SIZE = 64 * 1024  # large read chunks (in bytes) for waveform and screenshot transfers
     CHANNELS = (1, 2, 3, 4)  # available channels
     NHDIVS = 12  # Number of horizontal divisions
     NVDIVS = 8  # Number of vertical divisions
     NO_ERROR_CODE = '0,"No error"'  # error code returned when no error
     MAX_VDIV = 10.  # Max voltage per division (V)
     VUNITS = ('VOLT', 'WATT', 'AMP', 'UNKN') # vertical units
-    TBASES = [1, 2, 5]  # timebase relative values
-    TFACTORS = np.logspace(-9, 1, 11)  # timebase multiplying factors
-    TDIVS = np.ravel((np.tile(TBASES, (TFACTORS.size, 1)).T * TFACTORS).T)[2:]  # timebase values
+    # Timebase values, enumerated once at class definition in strictly ascending order
+    # (decades outer, mantissas inner), as required for nearest-value lookup
+    TDIVS = np.array([b * 10.**e for e in range(-9, 2) for b in (1., 2., 5.)])[2:]
+    LOG_TDIVS = np.log(TDIVS)  # log-timebase values (for nearest-value lookup)
 
     # Acquisition parameters
     COUPLING_MODES = (  # coupling modes
@@ -147,9 +149,8 @@ class RigolDS1054Z(Oscilloscope):
 
     def set_temporal_scale(self, value):
         ''' Set the temporal scale (in s/div) '''
-        # If not in set, replace with closest valid number (in log-distance)
-        if value not in self.TDIVS:
-            value = self.TDIVS[np.abs(np.log(self.TDIVS) - np.log(value)).argmin()]
+        # Replace with closest valid number (in log-distance)
+        value = self.get_closest_temporal_scale(value)
         self.log(f'setting time scale to {si_format(value, 2)}s/div')
         self.write(f'TIM:MAIN:SCAL {value}')
     
@@ -161,10 +162,7 @@ class RigolDS1054Z(Oscilloscope):
     def set_vertical_scale(self, ich, value):
         ''' Set the vertical sensitivity of the specified channel (in V/div) '''
         self.check_channel_index(ich)
-        if value > self.MAX_VDIV:
-            logger.warning(
-                f'target vertical scale ({value} V/div) above instrument limit ({self.MAX_VDIV} V/div) -> restricting')
-            value = self.MAX_VDIV
+        value = self.check_vertical_scale(value)
         self.log(f'setting channel {ich} vertical scale to {si_format(value, 2)}V/div')
         self.write(f'CHAN{ich}:SCAL {value}')
 
@@ -320,8 +318,8 @@ class RigolDS1054Z(Oscilloscope):
         self.write(f'TRIG:COUP {value}')
     
     def get_trigger_type(self):
-        ''' Get trigger type '''
-        return self.query('TRIG:MODE?')
+        ''' Get trigger type (cached until next write) '''
+        return self.cached_query('TRIG:MODE?')
     
     def set_trigger_type(self, val):
         ''' Set trigger type '''
@@ -329,6 +327,7 @@ class RigolDS1054Z(Oscilloscope):
             raise VisaError(
                 f'{val} not a valid trigger types. Candidates are {self.TRIG_TYPES}')
         self.write(f'TRIG:MODE {val}')
+        self.cache_reply('TRIG:MODE?', val)
     
     def get_trigger_status(self):
         ''' Get trigger status '''
@@ -653,32 +652,40 @@ class RigolDS1054Z(Oscilloscope):
         # Extract number of points from waveform header
         npts = self.get_waveform_header()['pnts']
 
-        # Initialize empty buffer and set starting position
-        buff = b''
+        # Initialize list of blocks and set starting position
+        blocks = []
+        nfetched = 0
         pos = 1
 
         # Loop until all bytes have been read
-        while len(buff) < npts:
+        while nfetched < npts:
             # Set waveform block start and stop position
             self.set_waveform_start(pos)
             self.set_waveform_stop(min(npts, pos + self.MAX_BYTE_LEN - 1))
 
-            # Query waveform block and append to buffer
-            buff += self.get_raw_waveform_buffer()
+            # Query waveform block and append it to list (concatenated only
+            # once at the end, to avoid re-copying the growing buffer)
+            blocks.append(self.get_raw_waveform_buffer())
+            nfetched += len(blocks[-1])
 
             # Increment position
             pos += self.MAX_BYTE_LEN
-            self.log(f'waveform acquisition: fetched {len(buff)}/{npts} points from internal memory')
+            self.log('waveform acquisition: fetched %s/%s points from internal memory', nfetched, npts)
         
         # Return waveform bytes
-        return buff
+        return b''.join(blocks)
 
-    def get_waveform_data(self, ich, **kwargs):
+    def fetch_waveform(self, ich, **kwargs):
         '''
-        Get waveform data from a specific channel
+        Fetch raw waveform samples and scaling parameters from a specific channel
         
         :param ich: channel index
-        :return: scaled waveform data (numpy array)
+        :return: 5-tuple with:
+            - y: raw unsigned 8-bit waveform samples
+            - vgain: vertical gain (V/sample unit)
+            - voff: vertical offset (V)
+            - dt: sampling interval (s)
+            - hoff: horizontal offset (s)
         '''
         # Check channel index
         self.check_channel_index(ich)
@@ -687,12 +694,34 @@ class RigolDS1054Z(Oscilloscope):
         buff = self._get_waveform_bytes(ich, **kwargs)
         wp = self.get_waveform_header()
 
-        # Convert bytes to samples array and rescale appropriately
-        y = np.array(list(struct.unpack(str(len(buff)) + 'B', buff)))
-        y = (y - wp['yorig'] - wp['yref']) * wp['yinc']
+        # View bytes as unsigned 8-bit codes, and return them with scaling parameters
+        y = np.frombuffer(buff, dtype=np.uint8)
+        vgain = wp['yinc']
+        voff = (wp['yorig'] + wp['yref']) * vgain
+        return y, vgain, voff, wp['xinc'], wp['xorig']
 
-        # Get time vector
-        t = np.arange(y.size) * wp['xinc'] + wp['xorig']  # s
+    def get_waveform_data(self, ich, dtype=np.float32, **kwargs):
+        '''
+        Get waveform data from a specific channel
+        
+        :param ich: channel index
+        :param dtype: floating point type of the output waveform signal (waveform bytes
+            are 8-bit ADC codes, hence single precision is sufficient by default)
+        :return: scaled waveform data (numpy array)
+        '''
+        # Fetch raw waveform
+        y, vgain, voff, dt, hoff = self.fetch_waveform(ich, **kwargs)
+
+        # Rescale waveform in a single buffer of the requested type
+        yscaled = np.empty(y.size, dtype=dtype)
+        np.multiply(y, vgain, out=yscaled, dtype=dtype)
+        np.subtract(yscaled, voff, out=yscaled)  # V
+        y = yscaled
+
+        # Get time vector, scaled and shifted in place
+        t = np.arange(y.size, dtype=np.float64)
+        t *= dt
+        t += hoff  # s
 
         # Return time and voltage vectors
         return t, y
@@ -4,6 +4,7 @@
 # @Last Modified by:   Theo Lemaire
 # @Last Modified time: 2022-08-15 09:59:04
 
+import math
 import numpy as np
 import operator
 
@@ -29,6 +30,7 @@ SI_powers = {
 }
 si_prefixes = {k: np.power(10., v) for k, v in SI_powers.items()}
 sorted_si_prefixes = sorted(si_prefixes.items(), key=operator.itemgetter(1))
+si_prefixes_by_power = {v: k for k, v in SI_powers.items()}
 
 
 def get_SI_pair(x, scale='lin', unit_dim=1):
@@ -61,3 +63,14 @@ def si_format(x, precision=0, space=' ', **kwargs):
         return [si_format(float(item), precision, space) for item in x]
     else:
         raise ValueError(f'cannot si_format {type(x)} objects')
+
+
+def fast_si_format(x, precision=0):
+    '''
+    Format a scalar according to the SI unit system, computing the prefix
+    directly from the value's decimal exponent (no space, no iterable support).
+    '''
+    if x == 0:
+        return f'{0:.{precision}f}'
+    exp = min(max(int(math.floor(math.log10(abs(x)) / 3) * 3), -24), 24)
+    return f'{x / 10.**exp:.{precision}f}{si_prefixes_by_power[exp]}'
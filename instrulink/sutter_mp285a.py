@@ -9,15 +9,11 @@ import struct
 import time
 import numpy as np
 
+from .errors import SutterError
 from .logger import logger
 from .utils import is_within
 
 
-class SutterError(Exception):
-    ''' Custom exception class for Sutter instrument '''
-    pass
-
-
 class SutterMP285A:
     '''' Interface to communicate with Sutter Manipulator 285 '''
 
@@ -144,7 +140,7 @@ class SutterMP285A:
     
     def write(self, cmd, convert_to_bytes=True):
         ''' Write a command into the serial instrument '''
-        logger.debug(f'WRITE: {cmd}')
+        logger.debug('WRITE: %s', cmd)
         if convert_to_bytes:
             cmd = bytes(cmd, self.ENC)
         self.instrument_handle.write(cmd + self.CR)
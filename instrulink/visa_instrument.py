@@ -5,20 +5,17 @@
 # @Last Modified time: 2024-05-07 15:24:58
 
 import abc
+import logging
+from contextlib import contextmanager
 import pyvisa
-import time
 import re
 import threading
-import numpy as np
+import time
 
 from .constants import S_TO_MS
+from .errors import VisaError
 from .logger import logger
-from .si_utils import si_format, SI_powers
-
-
-class VisaError(Exception):
-    ''' Custom exception class for VISA instrument '''
-    pass
+from .si_utils import si_format, si_prefixes
 
 
 def list_visa_resources():
@@ -33,13 +30,30 @@ class VisaInstrument(metaclass=abc.ABCMeta):
     ''' Generic interface to a VISA instrument using the SCPI command interface '''
 
     PREFIX = ''  # Prefix to add to each command
-    _lock = threading.Lock()  # Lock to prevent concurrent access to the instrument
+    BATCH_SCPI = False  # whether the instrument accepts compound (';'-separated) command messages
+    _lock = threading.RLock()  # (reentrant) lock to prevent concurrent access to the instrument
+
+    def __init_subclass__(cls, **kwargs):
+        '''
+        Precompute lookup attributes of instrument subclasses upon definition:
+        - compiled USB identifier pattern
+        - set of available channels, for constant-time channel index validation
+        '''
+        super().__init_subclass__(**kwargs)
+        if 'USB_ID' in cls.__dict__:
+            cls.USB_ID_PATTERN = re.compile(cls.USB_ID)
+        if isinstance(cls.__dict__.get('CHANNELS'), (tuple, list)):
+            cls.CHANNEL_SET = frozenset(cls.CHANNELS)
 
     def __init__(self, testmode=False, lock=False):
         ''' Initialization. '''
         self.instrument_handle = None
         self.testmode = testmode
         self.lock = lock
+        self._query_cache = {}  # query replies known to reflect current state
+        self._idn = None  # instrument ID string (static, queried once per connection)
+        self._batch = threading.local()  # per-thread write batch state
+        self._io_thread = threading.local()  # per-thread I/O locking state
         if not testmode:
             self.connect()
 
@@ -47,6 +61,18 @@ class VisaInstrument(metaclass=abc.ABCMeta):
         ''' String representation '''
         return f'{self.__class__.__name__}: {self.get_idn()}'
 
+    def __enter__(self):
+        ''' Context manager entry. '''
+        return self
+
+    def __exit__(self, *exc):
+        ''' Context manager exit: bring instrument to a safe state and disconnect. '''
+        try:
+            if self.is_connected():
+                self.safe_shutdown()
+        finally:
+            self.disconnect()
+
     def __del__(self):
         ''' Destruction. '''
         if self.is_connected():
@@ -61,7 +87,7 @@ class VisaInstrument(metaclass=abc.ABCMeta):
         resources = rm.list_resources()
         if len(resources) == 0:
             raise VisaError('no instrument detected')
-        res_id = next((item for item in resources if re.search(self.USB_ID, item) is not None), None)
+        res_id = next((item for item in resources if self.USB_ID_PATTERN.search(item) is not None), None)
         if res_id is None:
             raise VisaError(
                 f'{self.__class__.__name__} instrument ID "{self.USB_ID}" not detected in USB resources.'
@@ -69,6 +95,12 @@ class VisaInstrument(metaclass=abc.ABCMeta):
 
         # Open resource and store its handle
         self.instrument_handle = rm.open_resource(res_id)
+        self._idn = None
+
+        # Set serial baud rate, if defined and relevant (before any I/O operation)
+        if hasattr(self, 'BAUDRATE') and isinstance(
+                self.instrument_handle, pyvisa.resources.SerialInstrument):
+            self.instrument_handle.baud_rate = self.BAUDRATE
 
         # Reset instrument and clear error queue
         self.reset()
@@ -77,71 +109,255 @@ class VisaInstrument(metaclass=abc.ABCMeta):
         # Set instrument timeout, if defined
         if hasattr(self, 'TIMEOUT_SECONDS'):
             self.timeout = self.TIMEOUT_SECONDS * S_TO_MS
+
+        # Set data transfer chunk size, if defined
+        if hasattr(self, 'CHUNK_SIZE'):
+            self.chunk_size = self.CHUNK_SIZE
         
         # Print connection info
         print(f'{f" {repr(self)} ":-^100}')
 
     def disconnect(self):
-        ''' Disconnect from instrument. '''
-        self.instrument_handle = None
+        ''' Disconnect from instrument, closing its VISA session. '''
+        try:
+            if self.instrument_handle is not None:
+                self.instrument_handle.close()
+        finally:
+            self.instrument_handle = None
+            self._idn = None
 
     def is_connected(self):
         ''' Check if instrument is connected. '''
         return self.instrument_handle is not None
+
+    def safe_shutdown(self):
+        ''' Bring instrument to a safe state before disconnection. '''
+        pass
     
     def process_text(self, text):
         ''' Process text before sending to instrument. '''
-        if not text.startswith('*'):
-            return f'{self.PREFIX}{text}'
-        return text
+        # No prefix to add for common (*-starting) commands, or if instrument has no prefix
+        if not self.PREFIX or text[:1] == '*':
+            return text
+        return self.PREFIX + text
     
+    @contextmanager
+    def locked(self):
+        '''
+        Context manager holding the instrument lock (if locking is enabled, globally or
+        for the calling thread), allowing to make a sequence of I/O operations atomic.
+        Reentrant, such that it can wrap methods that are themselves locked.
+        '''
+        if not (self.lock or getattr(self._io_thread, 'locking', False)):
+            yield
+            return
+        with self._lock:
+            yield
+
+    @contextmanager
+    def thread_locking(self):
+        '''
+        Context manager enabling locking of the I/O operations issued by the calling
+        thread (regardless of the lock flag), such that worker threads sharing the
+        instrument can interleave their query/response exchanges safely.
+        '''
+        locking = getattr(self._io_thread, 'locking', False)
+        self._io_thread.locking = True
+        try:
+            yield
+        finally:
+            self._io_thread.locking = locking
+
     def query(self, text):
         ''' Query instrument and return response. '''
-        if self.lock:
-            self._lock.acquire()
+        self.flush_writes()
         text = self.process_text(text)
-        logger.debug(f'QUERY: {text}')
-        if not self.testmode:
-            out = self.instrument_handle.query(text)[:-1]
-        else: 
-            out = None
-        if self.lock:
-            self._lock.release()
-        return out
+        logger.debug('QUERY: %s', text)
+        if self.testmode:
+            return None
+        with self.locked():
+            return self.instrument_handle.query(text)[:-1]
     
     def query_binary_values(self, text, *args, **kwargs):
         ''' Query instrument and return binary response. '''
-        if self.lock:
-            self._lock.acquire()
+        self.flush_writes()
         text = self.process_text(text)
-        logger.debug(f'QUERY_BINARY_VALUES: {text}')
-        if not self.testmode:
-            out = self.instrument_handle.query_binary_values(text, *args, **kwargs)
-        else:
-            out = None
-        if self.lock:
-            self._lock.release()
+        logger.debug('QUERY_BINARY_VALUES: %s', text)
+        if self.testmode:
+            return None
+        with self.locked():
+            return self.instrument_handle.query_binary_values(text, *args, **kwargs)
+
+    def query_many(self, texts):
+        '''
+        Query instrument for several values, as a single compound message if supported
+        
+        :param texts: list of query texts
+        :return: list of responses
+        '''
+        if not self.BATCH_SCPI or len(texts) < 2:
+            return [self.query(text) for text in texts]
+        # Leading query is prefixed by query itself
+        out = self.query(';'.join([texts[0]] + [self.process_text(text) for text in texts[1:]]))
+        if out is None:
+            return [None] * len(texts)
+        out = out.split(';')
+        if len(out) != len(texts):
+            raise VisaError(f'expected {len(texts)} responses, got {len(out)} ("{";".join(out)}")')
+        return out
+
+    def cached_query(self, text, parser=None, raw=False, ttl=None):
+        '''
+        Query instrument and return (parsed) response, or return cached response if
+        no affecting command was written since it was last queried or set (and it
+        has not expired)
+        
+        :param text: query text
+        :param parser: function applied to the raw response (optional)
+        :param raw: whether to query the raw binary content of the answer
+        :param ttl: time to live of the cached response (in s), to bound its staleness
+            w.r.t. changes not made through this session (e.g. on the front panel).
+            If None, the response is kept until invalidated by a written command.
+        '''
+        try:
+            out, expiry = self._query_cache[text]
+            if expiry is None or time.monotonic() < expiry:
+                return out
+        except KeyError:
+            pass
+        out = self.query_raw(text) if raw else self.query(text)
+        if parser is not None:
+            out = parser(out)
+        self.cache_reply(text, out, ttl=ttl)
         return out
 
+    def cache_reply(self, text, value, ttl=None):
+        '''
+        Store the known response to a query, after writing the command that set it.
+
+        :param text: query text
+        :param value: (parsed) query response
+        :param ttl: time to live of the cached response (in s), or None for no expiry
+        '''
+        expiry = None if ttl is None else time.monotonic() + ttl
+        self._query_cache[text] = (value, expiry)
+
+    def affects_cached_reply(self, cmd, query):
+        '''
+        Whether a written command may alter the cached response to a query. Conservative
+        by default (any command may alter any response), to be refined per instrument.
+
+        :param cmd: written command (unprocessed)
+        :param query: cached query text
+        '''
+        return True
+
+    def invalidate_cache(self, cmd=None):
+        '''
+        Clear cached query responses: all of them, or only those that a written
+        command may alter.
+
+        :param cmd: written command (optional)
+        '''
+        if cmd is None:
+            self._query_cache.clear()
+            return
+        for query in [q for q in self._query_cache if self.affects_cached_reply(cmd, q)]:
+            self._query_cache.pop(query, None)
+
+    @property
+    def _write_buffer(self):
+        ''' Commands pending in the calling thread's write batch (None if not batching) '''
+        return getattr(self._batch, 'buffer', None)
+
+    @_write_buffer.setter
+    def _write_buffer(self, value):
+        self._batch.buffer = value
+
     def write(self, text):
-        ''' Send command to instrument. '''
-        if self.lock:
-            self._lock.acquire()
+        ''' Send command to instrument (or append it to pending commands during a write batch). '''
+        # Written command may alter instrument state -> invalidate affected cached replies
+        self.invalidate_cache(text)
         text = self.process_text(text)
-        logger.debug(f'WRITE: {text}')
+        if self._write_buffer is not None:
+            self._write_buffer.append(text)
+            return
+        self.send(text)
+
+    def send(self, text):
+        ''' Send already processed message to instrument. '''
+        logger.debug('WRITE: %s', text)
         if not self.testmode:
-            self.instrument_handle.write(f'{text}')
-        if self.lock:
-            self._lock.release()
+            with self.locked():
+                self.instrument_handle.write(f'{text}')
+
+    def write_many(self, cmds):
+        '''
+        Send several commands to instrument, as a single compound message if supported
+        
+        :param cmds: list of commands
+        '''
+        for cmd in cmds:
+            self.invalidate_cache(cmd)
+        cmds = [self.process_text(cmd) for cmd in cmds]
+        if self._write_buffer is not None:
+            self._write_buffer.extend(cmds)
+        elif self.BATCH_SCPI:
+            self.send(';'.join(cmds))
+        else:
+            for cmd in cmds:
+                self.send(cmd)
+
+    def flush_writes(self):
+        ''' Send commands pending in the current write batch, if any. '''
+        if self._write_buffer:
+            cmds, self._write_buffer = self._write_buffer, []
+            self.send(';'.join(cmds))
+
+    @contextmanager
+    def batch_writes(self):
+        '''
+        Context manager accumulating written commands and sending them as a single
+        compound message (upon exit, or before any query). No-op if the instrument
+        does not support compound messages, or if a batch is already ongoing.
+
+        The batch is specific to the calling thread: commands written from other
+        threads are not buffered, and the instrument lock is held for the whole
+        batch (regardless of the lock flag), such that other threads' locked I/O
+        operations cannot interleave with it. Commands still pending when the block
+        raises an exception are dropped, along with all cached query replies (which
+        may have been seeded from these commands).
+        '''
+        if not self.BATCH_SCPI or self._write_buffer is not None:
+            yield
+            return
+        with self._lock:
+            self._write_buffer = []
+            try:
+                yield
+                self.flush_writes()
+            except BaseException:
+                self.invalidate_cache()
+                raise
+            finally:
+                self._write_buffer = None
     
     def read_raw(self):
         ''' Read the raw binary content of an instrument answer '''
-        if self.lock:
-            self._lock.acquire()
-        out = self.instrument_handle.read_raw()
-        if self.lock:
-            self._lock.release()
-        return out
+        self.flush_writes()
+        with self.locked():
+            return self.instrument_handle.read_raw()
+
+    def query_raw(self, text):
+        ''' Query instrument and return the raw binary content of its answer. '''
+        self.flush_writes()
+        text = self.process_text(text)
+        logger.debug('QUERY_RAW: %s', text)
+        if self.testmode:
+            return None
+        with self.locked():
+            self.instrument_handle.write(text)
+            return self.instrument_handle.read_raw()
 
     def reset(self):
         ''' Reset the function generator to its factory default state '''
@@ -162,10 +378,12 @@ class VisaInstrument(metaclass=abc.ABCMeta):
             - the 4th part is the digital board version number or some other
             information about the instrument
         '''
-        try:
-            return self.query('*IDN?')
-        except pyvisa.errors.VisaIOError as e:
-            return None
+        if self._idn is None:
+            try:
+                self._idn = self.query('*IDN?')
+            except pyvisa.errors.VisaIOError as e:
+                return None
+        return self._idn
     
     def get_name(self):
         ''' Get a simplified manufacturer-model string representation of the instrument '''
@@ -179,6 +397,10 @@ class VisaInstrument(metaclass=abc.ABCMeta):
     def is_operation_complete(self):
         ''' Query whether the previous operations are completed. '''
         return bool(int(self.query('*OPC?')))
+
+    def get_event_status_register(self):
+        ''' Get (and clear) the standard event status register value. '''
+        return int(self.query('*ESR?'))
     
     abc.abstractmethod
     def wait(self, *args, **kwargs):
@@ -195,9 +417,17 @@ class VisaInstrument(metaclass=abc.ABCMeta):
         ''' Set I/O operations timeout paramerer (in ms) '''
         self.instrument_handle.timeout = value
     
-    def log(self, msg):
-        ''' Log a message prefixed with with class name '''
-        logger.info(f'{self.__class__.__name__}: {msg}')
+    def log(self, msg, *args):
+        '''
+        Log a message prefixed with with class name
+        
+        :param msg: message, possibly containing %-style placeholders
+        :param args: placeholder values, only formatted if the message is emitted
+        '''
+        if logger.isEnabledFor(logging.INFO):
+            if args:
+                msg = msg % args
+            logger.info(f'{self.__class__.__name__}: {msg}')
 
     # --------------------- I/O PROCESSING ---------------------
 
@@ -207,27 +437,30 @@ class VisaInstrument(metaclass=abc.ABCMeta):
     
     def process_int_mo(self, out, rgxp, key):
         ''' Process an integer notation regexp match object '''
-        mo = re.match(rgxp, out)
+        if isinstance(rgxp, str):
+            rgxp = re.compile(rgxp)
+        mo = rgxp.match(out)
         if mo is None:
-            raise VisaError(f'could not extract {key} from "{out}" (rgxp = "{rgxp}")')
+            raise VisaError(f'could not extract {key} from "{out}" (rgxp = "{rgxp.pattern}")')
         return int(mo[1])
     
     def process_float(self, val, suffix):
+        ''' Rescale a float value according to the SI prefix of its unit suffix '''
         if suffix in self.UNITS:
-            exp = 0
-        else:
-            try:
-                exp = SI_powers[suffix[0]]
-            except KeyError:
-                exp = SI_powers[suffix[0].swapcase()]
-        factor = np.float_power(10, exp)
+            return val
+        try:
+            factor = si_prefixes[suffix[0]]
+        except KeyError:
+            factor = si_prefixes[suffix[0].swapcase()]
         return val * factor
     
     def process_float_mo(self, out, rgxp, key):
         ''' Process a float notation regexp match object '''
-        mo = re.match(rgxp, out)
+        if isinstance(rgxp, str):
+            rgxp = re.compile(rgxp)
+        mo = rgxp.match(out)
         if mo is None:
-            raise VisaError(f'could not extract {key} from "{out}" (rgxp = "{rgxp}")')
+            raise VisaError(f'could not extract {key} from "{out}" (rgxp = "{rgxp.pattern}")')
         val = float(mo[1])
         suffix = mo[2]
         return self.process_float(val, suffix)
@@ -266,18 +499,17 @@ class VisaInstrument(metaclass=abc.ABCMeta):
     #--------------------- CHAINING ---------------------
 
     def chain(self, func1, func2, interval=1.):
-        ''' Call 2 functions separated by a given interval (in s). '''
+        '''
+        Call 2 functions separated by a given interval (in s).
+        
+        :return: timer object running the second call (can be cancelled or joined)
+        '''
         if interval <= 0:
             raise VisaError(f'interval must be strictly positive')
-        def func2wrap():
-            time.sleep(interval)
-            func2()
         func1()
-        if interval == 0.:
-            func2()
-        else:
-            thread = threading.Thread(target=func2wrap)
-            thread.start()
+        timer = threading.Timer(interval, func2)
+        timer.start()
+        return timer
     
     #--------------------- TRIGGER ---------------------
 
@@ -299,7 +531,7 @@ class VisaInstrument(metaclass=abc.ABCMeta):
 
     def check_channel_index(self, ich):
         ''' Check if channel index is valid. '''
-        if ich not in self.CHANNELS:
+        if ich not in self.CHANNEL_SET:
             raise VisaError(f'{ich} is not a valid channel index (values are {self.CHANNELS})')
 
     #--------------------- DATA TRANSFER ---------------------
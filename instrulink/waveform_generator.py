@@ -26,6 +26,10 @@ class WaveformGenerator(VisaInstrument):
         self.beep()
         # self.display_for('instrument connected', duration=1.0)
 
+    def safe_shutdown(self):
+        ''' Turn all outputs OFF before disconnection. '''
+        self.disable_output()
+
     def get_version(self):
         ''' Get system SCPI version. '''
         return float(self.query('SYST:VERS?'))
@@ -289,7 +293,12 @@ class WaveformGenerator(VisaInstrument):
             :param lb: lower bound
             :param ub: upper bound
         '''
-        return (y - y.min()) / np.ptp(y) * (ub - lb) + lb
+        ymin = y.min()
+        # Allocate a single output array, and rescale / shift it in place
+        out = np.subtract(y, ymin, dtype=np.float64)
+        out *= (ub - lb) / (y.max() - ymin)
+        out += lb
+        return out
 
     # --------------------- BURST ---------------------
 